@@ -7,37 +7,1514 @@ them using OpenCV. The application handles camera initialization, stream configu
 image acquisition, and cleanup.
 
 Commands:
-- "start" starts recording
+- "start" starts recording, "start WIDTHxHEIGHT" at a new resolution
 - "stop" stops recording
+- "stats" prints per-camera fps, stall and drop counters
+- "config" prints each camera's settings as read back from the camera
+- "set gain|exposure|fps VALUE [CAM]" changes a setting while streaming, "set size WIDTHxHEIGHT [CAM]",
+  "set offset X,Y|center [CAM]" and "set fov crop|full [CAM]" restart only the affected cameras' streams
 - "exit" exits the application
-- Displays resized 320x240 preview windows
+- Displays resized 320x240 preview windows, or one mosaic window (--preview mosaic)
+- Headless hosts serve the previews as MJPEG over HTTP instead (--preview http)
+- --shm publishes every camera's newest frame to shared memory for other local processes
 """
 import sys  # Import system-specific parameters and functions
 import numpy as np  # Import NumPy for numerical operations
 import cv2  # Import OpenCV for image processing
-import pytelicam  # Import the pytelicam SDK for camera control
+try:
+    import pytelicam  # Import the pytelicam SDK for camera control
+except ImportError:  # No TeliCamSDK on this machine, only the simulated cameras (--sim) can be used
+    pytelicam = None
 import threading  # Import threading for concurrent execution
 from datetime import datetime  # Import datetime for timestamping recordings
 from math import floor
 import traceback
 import os  # Import os for file operations
 import time
+import collections  # Import collections for the per-consumer frame queues
+import argparse  # Import argparse for command line options
+from math import ceil
+import multiprocessing  # Import multiprocessing for the encoder processes
+from multiprocessing import shared_memory  # Import shared_memory to pass frames to encoder processes without pickling
+import queue
+import tempfile
+import subprocess  # Import subprocess for the ffmpeg encoder backend
+import json  # Import json for the recording manifests
+import struct  # Import struct for the frame sidecar header
+import http.server  # Import http.server for the headless MJPEG preview
+import concurrent.futures  # Import concurrent.futures to open the cameras in parallel
+import hashlib  # Import hashlib to key the cached camera profiles
 
-class Recorder:
+class Frame:
+    # A single image copied out of the SDK ring buffer and handed to every consumer
+    def __init__(self, cam, image, pixel_format, block_id, timestamp, bayer_code=None):
+        self.cam = cam  # Index of the camera that produced the frame
+        self.image = image  # Frame data as a NumPy array
+        self.pixel_format = pixel_format
+        self.block_id = block_id  # Image index assigned by the camera
+        self.timestamp = timestamp  # Camera timestamp (ns on USB3 cameras)
+        self.received = time.monotonic()  # Host time the frame left the SDK buffer
+        self.bayer_code = bayer_code  # cv2 conversion code while image still holds raw Bayer data
+        self.raw = None  # (raw Bayer image, conversion code), kept once image is demosaiced, see raw_image()
+        self.lock = threading.Lock()
+        self.frame_id = block_id  # ChunkFrameID when chunk data is enabled, otherwise the stream block ID
+        self.exposure_time = None  # ChunkExposureTime in microseconds, when available
+        self.gain = None  # ChunkGain, when available
+        self.jpeg = None  # Compressed image while a pre-roll buffer holds the frame, image is None until decoded
+
+    def decompress(self):
+        # Decode a frame the pre-roll buffer stored as JPEG
+        if self.jpeg is None:
+            return
+        with self.lock:
+            if self.jpeg is not None:
+                self.image = cv2.imdecode(np.frombuffer(self.jpeg, np.uint8), cv2.IMREAD_UNCHANGED)
+                self.jpeg = None
+
+    def demosaiced(self):
+        # Image ready for display or encoding. Raw Bayer frames are converted by the
+        # first consumer that needs them, on that consumer's thread, and the result is shared.
+        self.decompress()
+        if self.bayer_code is None:
+            return self.image
+        with self.lock:
+            if self.bayer_code is not None:
+                self.raw = (self.image, self.bayer_code)
+                self.image = cv2.cvtColor(self.image, self.bayer_code)
+                self.bayer_code = None
+            return self.image
+
+    def raw_image(self):
+        # (image, bayer_code) as delivered, whether or not another consumer demosaiced the
+        # frame already, for consumers that pass raw Bayer on at one byte per pixel
+        with self.lock:
+            if self.raw is not None:
+                return self.raw
+            return self.image, self.bayer_code
+
+
+class LatencyStats:
+    # Running latency record: exact count/mean/max plus a window of recent samples for percentiles
+    def __init__(self, keep=2000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = collections.deque(maxlen=keep)
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.samples.append(seconds)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))]
+
+    def summary(self):
+        # Milliseconds, for printing
+        return (f"p50 {self.percentile(50) * 1000:.2f} ms | p99 {self.percentile(99) * 1000:.2f} ms | "
+                f"max {self.max * 1000:.2f} ms")
+
+    def report(self):
+        # Milliseconds, for machine-readable output
+        return {"count": self.count, "mean_ms": self.mean() * 1000, "p50_ms": self.percentile(50) * 1000,
+                "p99_ms": self.percentile(99) * 1000, "max_ms": self.max * 1000}
+
+
+class FrameConsumer:
+    # Bounded frame queue fed by the acquisition stage.
+    # Every consumer has its own depth and drop policy, so a slow consumer never
+    # takes frames away from the others.
+    # "latest" keeps only the newest queued frame of each camera, for consumers that sample
+    POLICIES = ("block", "drop_oldest", "drop_newest", "latest")
+
+    def __init__(self, name, cams=None, depth=2, policy="drop_oldest", block_timeout=1.0):
+        if policy not in self.POLICIES:
+            raise Exception(f"Unknown drop policy {policy}. Use one of {self.POLICIES}")
+        self.name = name
+        self.cams = cams  # Camera indices to receive, None for all cameras
+        self.depth = depth  # Maximum number of queued frames
+        self.policy = policy  # What to do when the queue is full
+        self.block_timeout = block_timeout  # Longest time a "block" consumer may stall acquisition
+        self.frames = collections.deque()
+        self.preloaded = 0  # Queued pre-roll frames, which don't count against depth
+        self.cond = threading.Condition()
+        self.delivered = 0  # Frames accepted into the queue
+        self.dropped = 0  # Frames lost because the queue was full
+        self.closed = False
+        self.enqueue_latency = LatencyStats()  # Time put() held up the acquisition stage
+        self.queue_latency = LatencyStats()  # Time a frame waited in the queue before get()
+
+    def wants(self, cam):
+        return self.cams is None or cam in self.cams
+
+    def put(self, frame):
+        # Called from the acquisition stage only
+        start = time.monotonic()
+        with self.cond:
+            if self.closed:
+                return False
+            if self.policy == "latest":
+                for n, (queued, _) in enumerate(self.frames):
+                    if queued.cam == frame.cam:  # Replaced before anyone looked at it
+                        del self.frames[n]
+                        self.dropped += 1
+                        break
+            if len(self.frames) - self.preloaded >= self.depth:
+                if self.policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+                elif self.policy in ("drop_oldest", "latest"):
+                    self.frames.popleft()
+                    self.dropped += 1
+                else:
+                    has_room = self.cond.wait_for(lambda: len(self.frames) - self.preloaded < self.depth or self.closed, self.block_timeout)
+                    if not has_room or self.closed:
+                        self.dropped += 1
+                        return False
+            now = time.monotonic()
+            self.frames.append((frame, now))
+            self.delivered += 1
+            self.enqueue_latency.add(now - start)
+            self.cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        # Returns the oldest queued frame, or None on timeout / once closed and drained
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.frames or self.closed, timeout):
+                return None
+            if not self.frames:
+                return None
+            frame, enqueued = self.frames.popleft()
+            if self.preloaded:
+                self.preloaded -= 1
+            self.queue_latency.add(time.monotonic() - enqueued)
+            self.cond.notify_all()
+            return frame
+
+    def preload(self, frames):
+        # Queue frames ahead of any live ones without counting them against depth, so a
+        # pre-roll backlog never makes the drop policy kick in for the frames that follow
+        with self.cond:
+            now = time.monotonic()
+            self.frames.extend((frame, now) for frame in frames)
+            self.preloaded += len(frames)
+            self.delivered += len(frames)
+            self.cond.notify_all()
+
+    def close(self):
+        # Stop accepting frames; queued frames can still be drained with get()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class PrerollBuffer:
+    # Keeps the last `seconds` of one camera's frames so a recording can start before the
+    # operator typed "start". Frames are kept as they arrive (raw Bayer stays one byte per
+    # pixel) or JPEG-compressed on a background thread, and the oldest are evicted once the
+    # buffer holds more than max_mb. Registered like a consumer; while recording it hands
+    # every frame straight on to the recording queue instead of keeping it. In synchronized
+    # mode it is fed whole frame sets and keeps or drops the same sets on every camera.
+    FORMATS = ("raw", "jpeg")
+
+    def __init__(self, cam, seconds, format="raw", max_mb=512, quality=90):
+        if format not in self.FORMATS:
+            raise Exception(f"Unknown pre-roll format {format}. Use one of {self.FORMATS}")
+        self.name = f"pre-roll cam{cam}"
+        self.cam = cam
+        self.seconds = seconds
+        self.format = format
+        self.max_bytes = max_mb * 1e6  # Memory cap for the stored frames
+        self.quality = quality  # JPEG quality
+        # Entries are (frame, bytes, frame set index or None, time the window is measured from)
+        self.compressed = collections.deque()  # Oldest entries, already JPEG-compressed
+        self.pending = collections.deque()  # Newest entries, as received
+        self.bytes = 0  # Memory held by the stored frames, the sum of the entries' sizes
+        self.peak_bytes = 0
+        self.capped = 0  # Frames evicted early because of max_mb
+        self.forward = None  # Recording queue while recording
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = None
+        if format == "jpeg":
+            self.thread = threading.Thread(target=self._compress)
+            self.thread.start()
+
+    def wants(self, cam):
+        return cam == self.cam
+
+    def put(self, frame, set_index=None, set_time=None):
+        # Called from the acquisition stage, or with the set's index and release time by the
+        # frame set assembler, so every camera's window covers the same sets
+        with self.cond:
+            if self.closed:
+                return False
+            if self.forward is not None:
+                return self.forward.put(frame)
+            stored = self._snapshot(frame)
+            now = frame.received if set_time is None else set_time
+            self.pending.append((stored, stored.image.nbytes, set_index, now))
+            self.bytes += stored.image.nbytes
+            self._evict(now)
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+            self.cond.notify_all()
+            return True
+
+    @staticmethod
+    def _snapshot(frame):
+        # A private Frame holding the pixels as they are now. Other consumers demosaic the
+        # shared frame in place (frame.image is replaced), which must not change what is stored.
+        image, bayer_code = frame.raw_image()  # Raw Bayer stays one byte per pixel even if already demosaiced
+        stored = Frame(frame.cam, image, frame.pixel_format, frame.block_id, frame.timestamp, bayer_code)
+        stored.received, stored.frame_id = frame.received, frame.frame_id
+        stored.exposure_time, stored.gain = frame.exposure_time, frame.gain
+        stored.jpeg = frame.jpeg
+        return stored
+
+    def _evict(self, now):
+        # Drop the oldest frames beyond the time window or the memory cap
+        for frames in (self.compressed, self.pending):
+            while frames and (now - frames[0][3] > self.seconds or self.bytes > self.max_bytes):
+                if self.bytes > self.max_bytes and now - frames[0][3] <= self.seconds:
+                    self.capped += 1
+                self.bytes -= frames.popleft()[1]  # The size counted when the entry was stored
+
+    def _compress(self):
+        # Replace the oldest raw frame with a JPEG copy
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.closed)
+                if self.closed:
+                    return
+                entry = self.pending[0]
+            frame = entry[0]
+            image = frame.image if frame.bayer_code is None else cv2.cvtColor(frame.image, frame.bayer_code)
+            ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                continue
+            stored = Frame(frame.cam, None, frame.pixel_format, frame.block_id, frame.timestamp)
+            stored.received, stored.frame_id = frame.received, frame.frame_id
+            stored.exposure_time, stored.gain = frame.exposure_time, frame.gain
+            stored.jpeg = jpeg.tobytes()
+            with self.cond:
+                if self.pending and self.pending[0] is entry:  # Not evicted or flushed meanwhile
+                    self.pending.popleft()
+                    self.compressed.append((stored, len(stored.jpeg)) + entry[2:])
+                    self.bytes += len(stored.jpeg) - entry[1]
+
+    def first_set(self):
+        # Frame set index of the oldest stored frame, None if nothing is stored
+        with self.cond:
+            entries = self.compressed or self.pending
+            return entries[0][2] if entries else None
+
+    def start_forwarding(self, consumer, first_set=None):
+        # Flush the stored frames into the recording queue, then pass every new frame on.
+        # Both happen under the lock, so no frame is lost or written twice at the switch.
+        # With first_set only frames of that frame set onwards are flushed.
+        with self.cond:
+            entries = list(self.compressed) + list(self.pending)
+            if first_set is not None:
+                entries = [entry for entry in entries if entry[2] is not None and entry[2] >= first_set]
+            frames = [entry[0] for entry in entries]
+            self.compressed.clear()
+            self.pending.clear()
+            self.bytes = 0
+            consumer.preload(frames)
+            self.forward = consumer
+        return frames
+
+    def stop_forwarding(self):
+        with self.cond:
+            self.forward = None
+
+    def duration(self):
+        with self.cond:
+            frames = [entry[0] for entry in self.compressed] + [entry[0] for entry in self.pending]
+        return frames[-1].received - frames[0].received if len(frames) > 1 else 0.0
+
+    def __len__(self):
+        return len(self.compressed) + len(self.pending)
+
+    def clear(self):
+        with self.cond:
+            self.compressed.clear()
+            self.pending.clear()
+            self.bytes = 0
+
+    def close(self):
+        self.clear()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+
+
+# Recording codecs. "opencv" codecs go through cv2.VideoWriter, "ffmpeg" codecs pipe raw
+# frames into an ffmpeg process, where preset/crf/threads trade CPU for file size and
+# pix_fmt/mono_pix_fmt are the stored pixel formats for color and Mono8 input
+CODECS = {
+    "mp4v": {"backend": "opencv", "fourcc": "mp4v", "container": "mp4"},  # MPEG-4 Part 2, lossy
+    "mjpg": {"backend": "opencv", "fourcc": "MJPG", "container": "avi"},  # Cheapest to encode, large files
+    "ffv1": {"backend": "opencv", "fourcc": "FFV1", "container": "mkv"},  # Lossless, for archival
+    # 4:2:0, which every player decodes; left to itself ffmpeg picks 4:4:4 for BGR input
+    "x264": {"backend": "ffmpeg", "codec": "libx264", "container": "mp4", "preset": "veryfast", "crf": 23, "threads": 0,
+             "pix_fmt": "yuv420p", "mono_pix_fmt": "yuv420p"},
+    "x265": {"backend": "ffmpeg", "codec": "libx265", "container": "mp4", "preset": "fast", "crf": 28, "threads": 0,
+             "pix_fmt": "yuv420p", "mono_pix_fmt": "yuv420p"},
+    "ffv1-ffmpeg": {"backend": "ffmpeg", "codec": "ffv1", "container": "mkv", "preset": None, "crf": None, "threads": 0,
+                    "pix_fmt": "bgr0", "mono_pix_fmt": "gray"},  # Lossless, the input's own format
+}
+FFMPEG_OPTIONS = ("preset", "crf", "threads", "command")  # Settings only the ffmpeg backend understands
+
+
+class OpenCVVideoWriter:
+    # cv2.VideoWriter with the codec given by its FourCC
+    def __init__(self, filename, fourcc, fps, size, is_color=True):
+        self.filename = filename
+        self.writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*fourcc), fps, size, isColor=is_color)
+        if not self.writer.isOpened():
+            raise Exception(f"Can't open {filename} with codec {fourcc}")
+
+    def write(self, image):
+        self.writer.write(image)
+
+    def release(self):
+        self.writer.release()
+
+
+class FFmpegVideoWriter:
+    # Pipes raw BGR (or gray) frames into an ffmpeg process, which encodes and muxes on its own threads
+    def __init__(self, filename, fps, size, codec="libx264", preset="veryfast", crf=23, threads=0, command="ffmpeg",
+                 is_color=True, pix_fmt=None):
+        self.filename = filename
+        self.size = size
+        self.ndim = 3 if is_color else 2
+        self.skipped = 0  # Frames whose size didn't match the stream
+        args = [command, "-hide_banner", "-loglevel", "error", "-y",
+                "-f", "rawvideo", "-pix_fmt", "bgr24" if is_color else "gray", "-s", f"{size[0]}x{size[1]}",
+                "-r", str(fps), "-i", "-",
+                "-c:v", codec, "-threads", str(threads)]
+        if preset is not None:
+            args += ["-preset", str(preset)]
+        if crf is not None:
+            args += ["-crf", str(crf)]
+        if pix_fmt is not None:
+            args += ["-pix_fmt", pix_fmt]  # Stored format, otherwise ffmpeg picks one close to the input
+        args.append(filename)
+        try:
+            self.process = subprocess.Popen(args, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise Exception(f"Can't start {command} for {filename}. {e}")
+
+    def write(self, image):
+        if image.shape[1] != self.size[0] or image.shape[0] != self.size[1] or image.ndim != self.ndim:
+            self.skipped += 1  # cv2.VideoWriter drops these too; in a raw pipe they would corrupt the stream
+            return
+        try:
+            self.process.stdin.write(np.ascontiguousarray(image).data)
+        except (BrokenPipeError, OSError):
+            raise Exception(f"ffmpeg stopped writing {self.filename}: {self._errors()}")
+
+    def _errors(self):
+        self.process.wait()
+        return self.process.stderr.read().decode(errors="replace").strip() or f"exit code {self.process.returncode}"
+
+    def release(self):
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.close()  # End of input, ffmpeg finishes the file
+            except OSError:
+                pass
+        if self.process.wait() != 0:
+            print(f"ffmpeg failed on {self.filename}: {self._errors()}")
+        if self.skipped:
+            print(f"Skipped {self.skipped} frame(s) that did not match {self.size[0]}x{self.size[1]} in {self.filename}")
+
+
+def open_video_writer(codec, filename, fps, size, is_color=True):
+    # Open a writer for a CODECS entry (with any overrides already merged in).
+    # is_color=False takes single-channel frames, a third of the input of BGR.
+    if codec["backend"] == "ffmpeg":
+        options = {key: codec[key] for key in ("codec",) + FFMPEG_OPTIONS if key in codec}
+        return FFmpegVideoWriter(filename, fps, size, is_color=is_color,
+                                 pix_fmt=codec.get("pix_fmt" if is_color else "mono_pix_fmt"), **options)
+    return OpenCVVideoWriter(filename, codec["fourcc"], fps, size, is_color)
+
+
+manifest_lock = threading.Lock()
+
+def append_manifest(path, record):
+    # Add one finished segment to a session manifest (JSON lines, one segment per line).
+    # Only the recording process writes manifests, encoder processes send their segments
+    # back to it (an "a" mode write is not an atomic append on Windows).
+    with manifest_lock:
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+def read_manifest(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda record: (record["cam"], record["segment"]))  # Lines are appended as segments close
+
+
+# Per-frame sidecar records, written next to each camera's recording. Fixed size and in
+# write order, so "frame" and "received" are sorted and can be binary-searched (np.searchsorted)
+SIDECAR_DTYPE = np.dtype([
+    ("frame", "<u8"),  # Frame number within the recording
+    ("frame_id", "<i8"),  # Camera frame ID, -1 if unknown
+    ("camera_timestamp", "<u8"),  # Camera timestamp (ns on USB3 cameras)
+    ("received", "<f8"),  # Host time.monotonic() when the frame left the SDK buffer
+    ("encoded", "<f8"),  # Host time.monotonic() when the writer accepted the frame
+    ("segment", "<u4"),  # Segment file index, see the session manifest
+    ("segment_frame", "<u4"),  # Frame number within that segment
+])
+SIDECAR_MAGIC = b"TCPFRMS1"
+SIDECAR_HEADER = struct.Struct("<8sIId8x")  # Magic, record size, header size, wall clock minus monotonic clock
+
+
+class FrameSidecar:
+    # Appends one SIDECAR_DTYPE record per written frame
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        # time.time() - time.monotonic(), to turn "received"/"encoded" into wall-clock time
+        self.file.write(SIDECAR_HEADER.pack(SIDECAR_MAGIC, SIDECAR_DTYPE.itemsize, SIDECAR_HEADER.size,
+                                            time.time() - time.monotonic()))
+        self.record = np.zeros(1, SIDECAR_DTYPE)
+        self.count = 0
+
+    def append(self, frame_id, timestamp, received, encoded, segment, segment_frame):
+        record = self.record
+        record["frame"] = self.count
+        record["frame_id"] = -1 if frame_id is None else frame_id
+        record["camera_timestamp"] = timestamp or 0
+        record["received"] = received
+        record["encoded"] = encoded
+        record["segment"] = segment
+        record["segment_frame"] = segment_frame
+        self.file.write(record.tobytes())
+        self.count += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def _sidecar_header(path):
+    # (header size, wall-clock offset) of a frame sidecar, checking it is one this version reads
+    with open(path, "rb") as f:
+        header = f.read(SIDECAR_HEADER.size)
+    if len(header) < SIDECAR_HEADER.size:
+        raise Exception(f"{path} is not a frame sidecar")
+    magic, record_size, header_size, wall_offset = SIDECAR_HEADER.unpack(header)
+    if magic != SIDECAR_MAGIC or record_size != SIDECAR_DTYPE.itemsize:
+        raise Exception(f"{path} is not a frame sidecar this version can read")
+    return header_size, wall_offset
+
+def load_sidecar(path):
+    # Memory-map a frame sidecar as a NumPy structured array of SIDECAR_DTYPE records, one per
+    # written frame: records[n]["frame_id"], records["received"], ...
+    # sidecar_wall_offset() turns "received"/"encoded" into wall-clock time.
+    header_size, _ = _sidecar_header(path)
+    count = (os.path.getsize(path) - header_size) // SIDECAR_DTYPE.itemsize  # Ignore a partial record left by a crash
+    if count == 0:
+        return np.zeros(0, SIDECAR_DTYPE)
+    return np.memmap(path, dtype=SIDECAR_DTYPE, mode="r", offset=header_size, shape=(count,))
+
+def sidecar_wall_offset(path):
+    # time.time() - time.monotonic() when the sidecar was created; add it to "received"/"encoded"
+    return _sidecar_header(path)[1]
+
+
+class SegmentedWriter:
+    # Splits one camera's recording into segment files every segment_seconds, segment_frames
+    # or segment_mb (0 = no limit). The next segment is opened in the background while the
+    # current one fills and the finished one is closed in the background, so a boundary
+    # costs the encoder nothing. Each closed segment is appended to the session manifest,
+    # so a crash loses at most the segment being written. With on_segment the record is
+    # passed to it instead.
+    def __init__(self, cam, codec, base_name, fps, size, manifest, segment_seconds=0, segment_frames=0, segment_mb=0,
+                 is_color=True, on_segment=None):
+        self.cam = cam
+        self.codec = codec  # CODECS entry with overrides merged in
+        self.base_name = base_name  # Path without extension
+        self.fps = fps
+        self.size = size
+        self.is_color = is_color  # False for monochrome cameras
+        self.manifest = manifest
+        self.on_segment = on_segment  # Called with each finished segment's record instead of writing the manifest
+        self.segment_seconds = segment_seconds
+        self.segment_frames = segment_frames
+        self.segment_bytes = segment_mb * 1e6
+        self.segmented = bool(segment_seconds or segment_frames or segment_mb)
+        self.count = 0  # Segments opened so far
+        self.resized = 0  # Frames resized on the host
+        self.sidecar = FrameSidecar(f"{base_name}.frames")  # One for the whole recording, segments are a field
+        try:
+            self.current = self._open()  # The first file is opened right away so open errors surface at start
+        except Exception:
+            self.sidecar.close()
+            os.remove(self.sidecar.path)
+            raise
+        self.next = None
+        self.next_thread = None
+        self.closing = []  # Threads releasing finished segments
+        if self.segmented:
+            self._prepare_next()
+
+    def _open(self):
+        if self.segmented:
+            filename = f"{self.base_name}_{self.count:04d}.{self.codec['container']}"
+        else:
+            filename = f"{self.base_name}.{self.codec['container']}"
+        segment = {"cam": self.cam, "segment": self.count, "file": filename, "sidecar": self.sidecar.path, "frames": 0,
+                   "first_frame_id": None, "last_frame_id": None, "start": None, "end": None,
+                   "writer": open_video_writer(self.codec, filename, self.fps, self.size, self.is_color), "received": None}
+        self.count += 1
+        return segment
+
+    def _prepare_next(self):
+        def run():
+            try:
+                self.next = self._open()
+            except Exception as e:
+                self.next = e
+        self.next = None
+        self.next_thread = threading.Thread(target=run)
+        self.next_thread.start()
+
+    def _full(self, received):
+        segment = self.current
+        if not self.segmented or segment["frames"] == 0:
+            return False
+        if self.segment_frames and segment["frames"] >= self.segment_frames:
+            return True
+        if self.segment_seconds and received is not None and received - segment["received"] >= self.segment_seconds:
+            return True
+        if self.segment_bytes and os.path.exists(segment["file"]) and os.path.getsize(segment["file"]) >= self.segment_bytes:
+            return True
+        return False
+
+    def write(self, image, frame_id=None, received=None, timestamp=None):
+        if received is None:
+            received = time.monotonic()
+        if self._full(received):
+            self.next_thread.join()  # Normally finished long ago
+            if isinstance(self.next, Exception):
+                raise self.next
+            finished, self.current = self.current, self.next
+            self.sidecar.flush()  # Keep the sidecar in step with the finished segments
+            self._close(finished)
+            self._prepare_next()
+        segment = self.current
+        if image.shape[1] != self.size[0] or image.shape[0] != self.size[1]:
+            image = cv2.resize(image, self.size, interpolation=cv2.INTER_AREA)  # The camera couldn't deliver this size
+            self.resized += 1
+        segment["writer"].write(image)
+        self.sidecar.append(frame_id, timestamp, received, time.monotonic(), segment["segment"], segment["frames"])
+        if segment["frames"] == 0:
+            segment["first_frame_id"] = frame_id
+            segment["received"] = received
+            segment["start"] = datetime.now().isoformat(timespec="milliseconds")
+        segment["last_frame_id"] = frame_id
+        segment["end"] = datetime.now().isoformat(timespec="milliseconds")
+        segment["frames"] += 1
+
+    def _close(self, segment):
+        thread = threading.Thread(target=self._finish, args=(segment,))
+        thread.start()
+        self.closing.append(thread)
+
+    def _finish(self, segment):
+        segment["writer"].release()
+        if segment["frames"] == 0:  # Opened ahead of time but never needed
+            if os.path.exists(segment["file"]):
+                os.remove(segment["file"])
+            return
+        record = {key: value for key, value in segment.items() if key not in ("writer", "received")}
+        record["bytes"] = os.path.getsize(segment["file"]) if os.path.exists(segment["file"]) else 0
+        if self.on_segment is not None:
+            self.on_segment(record)
+        else:
+            append_manifest(self.manifest, record)
+
+    def release(self):
+        if self.next_thread is not None:
+            self.next_thread.join()
+            if isinstance(self.next, dict):
+                self._close(self.next)
+        self._close(self.current)
+        for thread in self.closing:
+            thread.join()  # Every file is complete and listed when release() returns
+        self.closing = []
+        self.sidecar.close()
+        if self.sidecar.count == 0 and os.path.exists(self.sidecar.path):
+            os.remove(self.sidecar.path)  # No frame was written, like the segment files nothing is left behind
+
+
+class FrameWriter:
+    # Encoder worker for one camera.
+    # Acquisition only copies the frame out and enqueues it; the encode cost is paid here.
+    def __init__(self, cam, writer, consumer, on_error=None):
+        self.cam = cam
+        self.writer = writer  # SegmentedWriter for this camera
+        self.consumer = consumer  # Bounded queue holding this camera's frames
+        self.on_error = on_error  # Called with this worker once it has given up, see _fail()
+        self.error = None  # Why the worker stopped before the recording did
+        self.written = 0
+        self.encode_latency = LatencyStats()
+        self.end_to_end = LatencyStats()  # Host receive to encoded
+        self.thread = threading.Thread(target=self._run)
+
+    def start(self):
+        self.thread.start()
+
+    def join(self):
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def _run(self):
+        # Write every queued frame until the consumer is closed and drained
+        try:
+            while True:
+                frame = self.consumer.get(timeout=0.5)
+                if frame is None:
+                    if self.consumer.closed:
+                        break
+                    continue
+                start = time.monotonic()
+                self.writer.write(frame.demosaiced(), frame.frame_id, frame.received, frame.timestamp)  # Write the frame to the video file
+                end = time.monotonic()
+                self.encode_latency.add(end - start)
+                self.end_to_end.add(end - frame.received)
+                self.written += 1
+        except Exception as e:
+            _fail_encoder(self, str(e))
+
+    def release(self):
+        self.writer.release()  # Release the video writer resources
+
+
+def _fail_encoder(frame_writer, error):
+    # An encoder worker can't go on (writer error, dead encoder process). Its queue is closed,
+    # so a "block" policy no longer holds up acquisition, and emptied to free the frames,
+    # then the owner is told so it can detach the queue and report the camera.
+    frame_writer.error = error
+    print(f"Camera {frame_writer.cam}: encoder stopped, the rest of this recording is lost | {error}")
+    frame_writer.consumer.close()
+    while frame_writer.consumer.get(timeout=0) is not None:
+        frame_writer.consumer.dropped += 1
+    if frame_writer.on_error is not None:
+        frame_writer.on_error(frame_writer)
+
+
+def _encode_process(shm_name, slot_bytes, filled, free, results, segments, fps, size):
+    # Runs in an encoder process: encodes the frames the parent places in the shared-memory slot ring.
+    # Sends ("segment", record) for every finished segment and ("done", encode times, error) at the end.
+    shm = shared_memory.SharedMemory(name=shm_name)
+    writer = None
+    encode_times = []  # (encode, host receive to encoded) per frame; the monotonic clock is system-wide
+    error = None  # Sent back so the parent can say why this process stopped
+    try:
+        writer = SegmentedWriter(fps=fps, size=size, on_segment=lambda record: results.put(("segment", record)), **segments)
+        while True:
+            item = filled.get()
+            if item is None:  # The parent has no more frames
+                break
+            slot, shape, dtype, bayer_code, frame_id, received, timestamp = item
+            image = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * slot_bytes)
+            start = time.monotonic()
+            if bayer_code is not None:
+                writer.write(cv2.cvtColor(image, bayer_code), frame_id, received, timestamp)  # Demosaic here, on the encoder's core
+            else:
+                writer.write(image, frame_id, received, timestamp)
+            end = time.monotonic()
+            encode_times.append((end - start, end - received))
+            del image  # Drop the view before the slot is reused
+            free.put(slot)  # Hand the slot back to the parent
+    except Exception as e:
+        error = str(e)
+    finally:
+        if writer is not None:
+            writer.release()
+        shm.close()
+        results.put(("done", encode_times, error))
+
+
+class ProcessFrameWriter:
+    # Encoder process for one camera.
+    # Frames are copied into a ring of shared-memory slots and only the slot index is
+    # sent to the child, so encoding runs on another core outside this process's GIL.
+    def __init__(self, cam, consumer, segments, fps, size, slots=8, source_size=None, on_error=None):
+        self.cam = cam
+        self.consumer = consumer  # Bounded queue holding this camera's frames
+        self.on_error = on_error  # Called with this worker once it has given up, see _fail_encoder()
+        self.error = None  # Why the worker stopped before the recording did
+        self.collected = False  # The encoder process's final results have been read
+        self.manifest = segments["manifest"]  # Written here from the segments the encoder process reports
+        # segments holds the SegmentedWriter settings; the writer itself lives in the encoder process
+        source_size = source_size or size  # Frames arrive at the camera's size and are resized in the encoder process
+        self.slot_bytes = max(size[0] * size[1], source_size[0] * source_size[1]) * (3 if segments.get("is_color", True) else 1)
+        self.written = 0
+        self.oversized = 0  # Frames too large for a slot
+        self.encode_latency = LatencyStats()  # Measured in the encoder process
+        self.end_to_end = LatencyStats()  # Host receive to encoded, also measured in the encoder process
+        self.slot_wait = LatencyStats()  # Time spent waiting for the encoder to free a slot
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slots)
+        context = multiprocessing.get_context("spawn")  # Never fork a process that is running camera threads
+        self.free = context.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.filled = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(target=_encode_process, daemon=True,
+                                       args=(self.shm.name, self.slot_bytes, self.filled, self.free, self.results,
+                                             segments, fps, size))
+        self.thread = threading.Thread(target=self._run)
+
+    def start(self):
+        self.process.start()
+        self.thread.start()
+
+    def _free_slot(self):
+        # Wait for a free slot, giving up if the encoder process has died
+        while True:
+            try:
+                return self.free.get(timeout=1.0)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    return None
+
+    def _run(self):
+        # Copy every queued frame into a free slot and pass the slot to the encoder process
+        try:
+            while True:
+                self._collect(timeout=0)  # List the segments the encoder process finished
+                frame = self.consumer.get(timeout=0.5)
+                if frame is None:
+                    if self.consumer.closed:
+                        break
+                    continue
+                frame.decompress()  # Pre-roll frames may still be JPEG
+                image, bayer_code = frame.raw_image()  # Raw Bayer frames are passed on undemosaiced, a third of the bytes
+                if image.nbytes > self.slot_bytes:
+                    self.oversized += 1
+                    continue
+                start = time.monotonic()
+                slot = self._free_slot()
+                if slot is None:
+                    self._collect(timeout=1.0)  # The child's own error, if it got to send it
+                    _fail_encoder(self, self.error or f"encoder process exited unexpectedly (exit code {self.process.exitcode})")
+                    return
+                self.slot_wait.add(time.monotonic() - start)
+                view = np.ndarray(image.shape, dtype=image.dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+                view[...] = image
+                del view
+                self.filled.put((slot, image.shape, image.dtype.str, bayer_code, frame.frame_id, frame.received, frame.timestamp))
+                self.written += 1
+        except Exception as e:
+            _fail_encoder(self, str(e))
+        self.filled.put(None)  # Tell the encoder process to finish
+
+    def _collect(self, timeout):
+        # Handle what the encoder process sent until nothing arrives within timeout (0 takes
+        # only what is there): finished segments go into the manifest, and the final message
+        # has the timings and error
+        while not self.collected:
+            try:
+                message = self.results.get(timeout=timeout) if timeout else self.results.get_nowait()
+            except queue.Empty:
+                return
+            if message[0] == "segment":
+                append_manifest(self.manifest, message[1])
+                continue
+            _, encode_times, error = message
+            for encode, end_to_end in encode_times:
+                self.encode_latency.add(encode)
+                self.end_to_end.add(end_to_end)
+            if error is not None and self.error is None:
+                self.error = error
+            self.collected = True
+
+    def join(self):
+        if self.thread.is_alive():
+            self.thread.join()
+        if self.process.pid is None:  # Never started
+            return
+        # Collect the encode timings before joining, otherwise the child can block flushing its queue
+        while not self.collected and (self.process.is_alive() or not self.results.empty()):
+            self._collect(timeout=1.0)
+        self.process.join()
+
+    def release(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.shm.close()
+        self.shm.unlink()  # Free the slot ring
+
+
+class FrameIdTracker:
+    # Checks the camera's frame IDs for gaps (skipped frames), duplicates and reorders
     def __init__(self):
+        self.last_id = None
+        self.gaps = 0  # Places where at least one frame was skipped
+        self.missing = 0  # Total number of skipped frame IDs
+        self.duplicates = 0
+        self.reorders = 0  # Frame IDs that went backwards
+
+    def observe(self, frame_id):
+        if self.last_id is not None:
+            delta = frame_id - self.last_id
+            if delta > 1:
+                self.gaps += 1
+                self.missing += delta - 1
+            elif delta == 0:
+                self.duplicates += 1
+            elif delta < 0:
+                self.reorders += 1
+        if self.last_id is None or frame_id > self.last_id:
+            self.last_id = frame_id
+
+    def counts(self):
+        return (self.gaps, self.missing, self.duplicates, self.reorders)
+
+    def restart(self):
+        # The camera restarts its frame IDs when its stream is restarted; keep the counts
+        self.last_id = None
+
+    @staticmethod
+    def describe(counts):
+        gaps, missing, duplicates, reorders = counts
+        return f"gaps {gaps} ({missing} frame(s) missing) | duplicates {duplicates} | reorders {reorders}"
+
+
+class FrameSetAssembler:
+    # Groups the frames of triggered cameras into one set per trigger.
+    # Cameras in trigger mode produce exactly one frame per trigger, so a frame's set is its
+    # frame ID relative to that camera's first frame. The cameras may start on different
+    # pulses, so a camera's first frame is placed by its receive time: the set whose frames
+    # arrived within half a trigger period of it. Sets are released in trigger order; a set
+    # still missing cameras after max_pending newer triggers is released with each missing
+    # camera's previous frame repeated, so every recording keeps the same frame count.
+    def __init__(self, cam_num, consumer, max_pending=8, period=None):
+        self.cam_num = cam_num
+        self.consumer = consumer  # Input queue fed by the acquisition stage
+        self.max_pending = max_pending
+        self.period = period  # Trigger period in seconds, None places every first frame in set 0
+        self.first_ids = [None] * cam_num
+        self.last_frames = [None] * cam_num  # Most recent frame of each camera, used as filler
+        self.pending = {}  # Set index -> {camera: frame}
+        self.set_times = {}  # Set index -> receive time of its first frame, for the recent sets
+        self.next_index = 0  # Next set to release
+        self.started = False  # A set has been released, so the first set can no longer move
+        self.outputs = []  # Consumers that receive the frames of every released set
+        self.outputs_lock = threading.Lock()
+        self.release_lock = threading.Lock()  # Held while a set is handed out, so outputs can switch between sets
+        self.complete = 0  # Sets released with a frame from every camera
+        self.incomplete = 0  # Sets released with at least one repeated frame
+        self.late = 0  # Frames that arrived after their set was released
+        self.unaligned = 0  # Frames from pulses before the first one every camera answered
+        self.misaligned = 0  # Complete sets spanning about a trigger period, so mixing two pulses
+        self.skew = LatencyStats()  # Spread of host receive times within a complete set
+        self.resyncs = {}  # Camera -> set index of its next frame or None, see resync()
+        self.thread = threading.Thread(target=self._run)
+
+    def start(self):
+        self.thread.start()
+
+    def join(self):
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def add_output(self, consumer):
+        with self.outputs_lock:
+            self.outputs.append(consumer)
+
+    def remove_output(self, consumer):
+        with self.outputs_lock:
+            if consumer in self.outputs:
+                self.outputs.remove(consumer)
+
+    def resync(self, cam, next_index=None, period=None):
+        # Camera cam restarted its stream, so its frame IDs start over. Its next frame belongs to
+        # set next_index when that is known (the software trigger was paused), otherwise it is
+        # placed by its receive time like a first frame.
+        if period:
+            self.period = period
+        self.resyncs[cam] = next_index
+
+    def _match(self, received):
+        # Set index of the pulse a frame received at this time answered: the nearest recent
+        # set plus the whole trigger periods in between. None without a period or any set yet.
+        if not self.period or not self.set_times:
+            return None
+        nearest = min(self.set_times, key=lambda index: abs(self.set_times[index] - received))
+        return nearest + round((received - self.set_times[nearest]) / self.period)
+
+    def _run(self):
+        while True:
+            frame = self.consumer.get(timeout=0.5)
+            if frame is None:
+                if self.consumer.closed:
+                    break
+                continue
+            if frame.cam in self.resyncs:
+                index = self.resyncs.pop(frame.cam)
+                if index is None:
+                    index = self._match(frame.received)
+                if index is None:
+                    index = max(self.pending, default=self.next_index - 1) + 1
+                self.first_ids[frame.cam] = frame.frame_id - index
+            elif self.first_ids[frame.cam] is None:
+                index = self._match(frame.received)
+                if index is None:
+                    index = 0  # The first camera to deliver
+                self.first_ids[frame.cam] = frame.frame_id - index
+                if not self.started and index > self.next_index:
+                    # This camera missed the pulses the others started on, those sets can never be complete
+                    for stale in [stale for stale in self.pending if stale < index]:
+                        self.unaligned += len(self.pending.pop(stale))
+                    self.next_index = index
+            index = frame.frame_id - self.first_ids[frame.cam]
+            if index < self.next_index:
+                if self.started:
+                    self.late += 1
+                else:
+                    self.unaligned += 1  # A pulse before the others started
+                continue
+            self.pending.setdefault(index, {})[frame.cam] = frame
+            self.set_times.setdefault(index, frame.received)
+            self._release_ready()
+
+    def _release_ready(self):
+        newest = max(self.pending)
+        while self.next_index <= newest:
+            frames = self.pending.get(self.next_index, {})
+            if len(frames) < self.cam_num and newest - self.next_index < self.max_pending:
+                break  # Give the missing cameras a little longer
+            self.pending.pop(self.next_index, None)
+            self._release(self.next_index, frames)
+            self.next_index += 1
+            self.started = True
+        for old in [old for old in self.set_times if old < self.next_index - self.max_pending]:
+            del self.set_times[old]
+
+    def _release(self, index, frames):
+        if len(frames) == self.cam_num:
+            self.complete += 1
+            received = [frame.received for frame in frames.values()]
+            spread = max(received) - min(received)
+            self.skew.add(spread)
+            if self.period and spread > self.period / 2:
+                self.misaligned += 1
+                if self.misaligned == 1:
+                    print(f"Frame set {index}: frames received {spread * 1000:.1f} ms apart, about a trigger period "
+                          f"({self.period * 1000:.1f} ms). The cameras may be answering different pulses")
+        else:
+            self.incomplete += 1
+        with self.outputs_lock:
+            outputs = list(self.outputs)
+        released = time.monotonic()  # One time for the whole set, pre-roll windows are measured from it
+        with self.release_lock:
+            for cam in range(self.cam_num):
+                frame = frames.get(cam, self.last_frames[cam])
+                if frame is None:
+                    continue  # Nothing to repeat yet
+                self.last_frames[cam] = frame
+                for output in outputs:
+                    if not output.wants(cam):
+                        continue
+                    if isinstance(output, PrerollBuffer):
+                        output.put(frame, index, released)
+                    else:
+                        output.put(frame)
+
+
+class PreviewServer:
+    # Headless preview: every camera's preview as an MJPEG stream over a local HTTP socket.
+    # A stream has its own consumer, added when a client connects and removed when it leaves,
+    # so nothing is resized or JPEG-encoded while nobody is watching. The consumer keeps only
+    # the newest frame and the socket write blocks on a slow client, so encoding runs at the
+    # client's pace (capped at the preview rate) and never queues frames behind it.
+    BOUNDARY = "frame"
+
+    def __init__(self, recorder, port=8080, host="127.0.0.1", quality=80):
+        self.recorder = recorder
+        self.quality = quality  # JPEG quality of the streamed previews
+        self.running = True
+        self.clients = 0  # Connected stream clients
+        self.served = 0  # JPEG frames sent to all clients
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass  # Don't print every request to the console
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/"
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.start()
+
+    def _handle(self, request):
+        path = request.path.split("?")[0].rstrip("/")
+        if path == "":
+            images = "".join(f'<img src="/cam/{i}" title="Camera {i}">' for i in range(self.recorder.cam_num))
+            body = f"<html><head><title>Cameras</title></head><body>{images}</body></html>".encode()
+            request.send_response(200)
+            request.send_header("Content-Type", "text/html")
+            request.send_header("Content-Length", str(len(body)))
+            request.end_headers()
+            request.wfile.write(body)
+        elif path.startswith("/cam/") and path[5:].isdigit() and int(path[5:]) < self.recorder.cam_num:
+            self._stream(request, int(path[5:]))
+        else:
+            request.send_error(404)
+
+    def _stream(self, request, cam):
+        request.send_response(200)
+        request.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={self.BOUNDARY}")
+        request.send_header("Cache-Control", "no-cache")
+        request.end_headers()
+        consumer = self.recorder.add_consumer(f"http preview {cam} {request.client_address[1]}", cams=[cam], depth=1, policy="latest")
+        with self.lock:
+            self.clients += 1
+        next_time = time.monotonic()
+        try:
+            while self.running:
+                frame = consumer.get(timeout=0.5)
+                if frame is None:
+                    continue
+                start = time.monotonic()
+                image = cv2.resize(frame.demosaiced(), dsize=self.recorder.preview_size)
+                ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                self.recorder.cam_stats[cam].stage("jpeg").add(time.monotonic() - start)
+                if not ok:
+                    continue
+                request.wfile.write(f"--{self.BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode())
+                request.wfile.write(jpeg.tobytes())
+                request.wfile.write(b"\r\n")
+                request.wfile.flush()  # Blocks while the client is behind
+                with self.lock:
+                    self.served += 1
+                if self.recorder.preview_fps:
+                    next_time += 1.0 / self.recorder.preview_fps
+                    delay = next_time - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_time = time.monotonic()  # Client or encoder fell behind, resynchronize
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass  # Client went away
+        finally:
+            self.recorder.remove_consumer(consumer)
+            with self.lock:
+                self.clients -= 1
+
+    def close(self):
+        self.running = False  # Ends the open streams within one consumer timeout
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+# Shared-memory preview ring, one named segment per camera ("<prefix>_cam<N>"):
+# SHARED_HEADER_DTYPE, then `slots` SHARED_SLOT_DTYPE headers, then the slot data, every part
+# 64-byte aligned. The publisher fills slot (seq - 1) % slots, writing its "seq" last, and then
+# sets "latest" to seq. A reader takes the slot of "latest" and maps the pixels in place; the
+# frame was intact if the slot's "seq" is unchanged after it is done with them.
+SHARED_MAGIC = b"TCPSHM01"
+SHARED_HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("cam", "<u4"),
+    ("slots", "<u4"),
+    ("slot_bytes", "<u8"),  # Data capacity of one slot
+    ("latest", "<u8"),  # Sequence number of the newest complete frame, 0 before the first one
+    ("closed", "<u4"),  # Set before the publisher removes the ring, e.g. to grow it for larger frames
+    ("pid", "<u4"),  # Publishing process
+    ("wall_offset", "<f8"),  # time.time() - time.monotonic(), to turn "received" into wall-clock time
+])
+SHARED_SLOT_DTYPE = np.dtype([
+    ("seq", "<u8"),  # Sequence number of the frame in this slot, 0 while it is being written
+    ("frame_id", "<i8"),  # Camera frame ID, -1 if unknown
+    ("camera_timestamp", "<u8"),  # Camera timestamp (ns on USB3 cameras)
+    ("received", "<f8"),  # Host time.monotonic() when the frame left the SDK buffer
+    ("height", "<u4"),
+    ("width", "<u4"),
+    ("channels", "<u4"),  # 1 for Mono8 and raw Bayer, 3 for BGR
+    ("bayer_code", "<i4"),  # cv2 demosaic code for raw Bayer frames, -1 otherwise
+    ("dtype", "S8"),  # NumPy dtype string of the pixels
+])
+
+
+def _shared_layout(slots, slot_bytes):
+    # Offsets of the slot headers and the slot data, and the total segment size
+    align = lambda n: (n + 63) // 64 * 64
+    headers = align(SHARED_HEADER_DTYPE.itemsize)
+    data = align(headers + slots * SHARED_SLOT_DTYPE.itemsize)
+    return headers, data, data + slots * align(slot_bytes), align(slot_bytes)
+
+
+class SharedFrameRing:
+    # Publisher side of one camera's shared-memory ring
+    def __init__(self, name, cam, slots, slot_bytes):
+        headers, self.data_offset, size, self.stride = _shared_layout(slots, slot_bytes)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:  # Left behind by a crashed run
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.header = np.ndarray(1, SHARED_HEADER_DTYPE, buffer=self.shm.buf)[0]
+        self.slot_headers = np.ndarray(slots, SHARED_SLOT_DTYPE, buffer=self.shm.buf, offset=headers)
+        self.header["magic"] = SHARED_MAGIC
+        self.header["cam"] = cam
+        self.header["slots"] = slots
+        self.header["slot_bytes"] = slot_bytes
+        self.header["pid"] = os.getpid()
+        self.header["wall_offset"] = time.time() - time.monotonic()
+        self.seq = 0
+        self.publish_latency = LatencyStats()
+
+    def publish(self, frame, image, bayer_code):
+        # image and bayer_code come from frame.raw_image(), frame.image may be replaced meanwhile
+        start = time.monotonic()
+        self.seq += 1
+        slot = (self.seq - 1) % self.slots
+        header = self.slot_headers[slot]
+        header["seq"] = 0  # Readers of this slot see it is being replaced
+        offset = self.data_offset + slot * self.stride
+        np.ndarray(image.shape, image.dtype, buffer=self.shm.buf, offset=offset)[...] = image
+        header["frame_id"] = -1 if frame.frame_id is None else frame.frame_id
+        header["camera_timestamp"] = frame.timestamp or 0
+        header["received"] = frame.received
+        header["height"], header["width"] = image.shape[:2]
+        header["channels"] = image.shape[2] if image.ndim == 3 else 1
+        header["bayer_code"] = -1 if bayer_code is None else bayer_code
+        header["dtype"] = image.dtype.str.encode()
+        header["seq"] = self.seq
+        self.header["latest"] = self.seq
+        self.publish_latency.add(time.monotonic() - start)
+
+    def close(self):
+        self.header["closed"] = 1
+        del self.header, self.slot_headers  # Views into the buffer must go before it can be closed
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedFrameReader:
+    # Reader side, for viewers and analysis tools in other processes:
+    #     reader = SharedFrameReader("tcpapp_cam0")
+    #     info, image = reader.latest()  # image maps the shared memory, nothing is copied
+    #     ...use image...
+    #     if not reader.valid(info): discard the result, the publisher overwrote the slot
+    # Reopen the reader once reader.closed is set.
+    def __init__(self, name):
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+            untrack = False
+        except TypeError:
+            self.shm = shared_memory.SharedMemory(name=name)
+            untrack = os.name == "posix"
+        self.header = np.ndarray(1, SHARED_HEADER_DTYPE, buffer=self.shm.buf)[0]
+        if self.header["magic"] != SHARED_MAGIC:
+            del self.header
+            self.shm.close()
+            raise Exception(f"{name} is not a frame ring this version can read")
+        if untrack and self.header["pid"] != os.getpid():
+            # Don't let this process's resource tracker remove the publisher's ring at exit
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        headers, self.data_offset, _, self.stride = _shared_layout(int(self.header["slots"]), int(self.header["slot_bytes"]))
+        self.slot_headers = np.ndarray(int(self.header["slots"]), SHARED_SLOT_DTYPE, buffer=self.shm.buf, offset=headers)
+
+    @property
+    def closed(self):
+        return bool(self.header["closed"])
+
+    def latest(self):
+        # (slot header copy, zero-copy image) of the newest frame, or (None, None) before the first one
+        for _ in range(3):
+            seq = int(self.header["latest"])
+            if seq == 0:
+                return None, None
+            slot = (seq - 1) % len(self.slot_headers)
+            info = self.slot_headers[slot].copy()
+            if info["seq"] != seq:
+                continue  # Overwritten between the two reads
+            shape = (int(info["height"]), int(info["width"])) + ((int(info["channels"]),) if info["channels"] > 1 else ())
+            image = np.ndarray(shape, np.dtype(info["dtype"].decode()), buffer=self.shm.buf,
+                               offset=self.data_offset + slot * self.stride)
+            return info, image
+        return None, None
+
+    def valid(self, info):
+        # True if the slot still holds the frame latest() returned with info
+        slot = (int(info["seq"]) - 1) % len(self.slot_headers)
+        return self.slot_headers[slot]["seq"] == info["seq"]
+
+    def close(self):
+        del self.header, self.slot_headers
+        self.shm.close()
+
+
+class SharedFramePublisher:
+    # Copies the newest frame of every camera into its shared-memory ring on its own thread.
+    # The consumer keeps one frame per camera, so a busy publisher skips frames instead of
+    # holding up acquisition, and readers only ever map the ring.
+    def __init__(self, consumer, prefix="tcpapp", slots=4):
+        self.consumer = consumer
+        self.prefix = prefix
+        self.slots = slots
+        self.rings = {}  # Camera index -> SharedFrameRing, created with the first frame
+        self.published = collections.Counter()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            frame = self.consumer.get(timeout=0.5)
+            if frame is None:
+                if self.consumer.closed:
+                    break
+                continue
+            image, bayer_code = frame.raw_image()  # Raw Bayer frames are published undemosaiced, one byte per pixel
+            ring = self.rings.get(frame.cam)
+            if ring is None or image.nbytes > ring.slot_bytes:  # First frame, or larger after a resolution change
+                if ring is not None:
+                    ring.close()
+                ring = self.rings[frame.cam] = SharedFrameRing(f"{self.prefix}_cam{frame.cam}", frame.cam, self.slots,
+                                                               image.nbytes)
+            ring.publish(frame, image, bayer_code)
+            self.published[frame.cam] += 1
+
+    def close(self):
+        # The consumer must be closed first
+        self.thread.join()
+        for ring in self.rings.values():
+            ring.close()
+        self.rings = {}
+
+
+class CameraStats:
+    # Per-camera acquisition counters, updated only by the thread that reads the camera
+    # (the SDK callback thread counts buffer busy and image errors)
+    def __init__(self, window=2.0):
+        self.window = window  # Seconds of history used for the fps estimate
+        self.frames = 0  # Frames published
+        self.stalls = 0  # wait_for_signal timeouts
+        self.signal_errors = 0  # Other wait_for_signal failures
+        self.grab_errors = 0  # Frames delivered with an error status
+        self.buffer_busy = 0  # Frames the SDK discarded because every ring buffer slot was locked
+        self.image_errors = 0  # Abnormal images reported by the SDK (packet loss, camera error)
+        self.buffer_count = 0  # Stream ring buffer size this camera was opened with
+        self.visits = 0  # Times the ring buffer was read
+        self.backlog_total = 0  # Sum of filled slots found per visit
+        self.backlog_max = 0  # Most filled slots found in one visit
+        self.ring_full = 0  # Visits that found the ring full, so older frames may have been overwritten
+        self.frame_ids = FrameIdTracker()
+        self.recent = collections.deque()  # Receive times inside the fps window
+        self.stages = {}  # Pipeline stage name -> LatencyStats, see stage()
+        self.encoder_error = None  # Why this camera's encoder stopped during the current recording
+        self.restart_error = None  # Why a live geometry change left this camera stopped
+
+    def stage(self, name):
+        # Latency record for one pipeline stage of this camera, created on first use
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages.setdefault(name, LatencyStats())
+        return stats
+
+    def record_frame(self, t):
+        self.frames += 1
+        self.recent.append(t)
+        while self.recent and t - self.recent[0] > self.window:
+            self.recent.popleft()
+
+    def record_backlog(self, pending):
+        # Occupancy of the SDK ring: slots that were waiting to be read
+        self.visits += 1
+        self.backlog_total += pending
+        self.backlog_max = max(self.backlog_max, pending)
+        if self.buffer_count and pending >= self.buffer_count - 1:
+            self.ring_full += 1
+
+    def overruns(self):
+        return self.buffer_busy + self.ring_full
+
+    def fps(self):
+        recent = list(self.recent)
+        if len(recent) < 2 or time.monotonic() - recent[-1] > self.window:
+            return 0.0
+        return (len(recent) - 1) / (recent[-1] - recent[0])
+
+
+# Settings a camera config file may give for every camera ("defaults") and per camera
+# serial number ("cameras"). None leaves the feature as the camera has it (exposure) or
+# centres the ROI (offsets). White balance "once" runs the one-shot at every configure.
+CAMERA_SETTINGS = {"width": int, "height": int, "fps": float, "gain": float, "exposure_time": float,
+                   "white_balance": str, "offset_x": int, "offset_y": int, "field_of_view": str}
+WHITE_BALANCE = ("once", "off", "continuous")
+
+
+def load_camera_config(path):
+    # Read and check a camera config file, JSON or TOML:
+    #     {"defaults": {"fps": 30, "gain": 12.0},
+    #      "cameras": {"1234567": {"gain": 18.0, "offset_x": 64}}}
+    with open(path, "rb") as f:
+        if path.lower().endswith(".toml"):
+            try:
+                import tomllib  # Python 3.11+
+            except ImportError:
+                raise Exception(f"{path}: TOML configs need Python 3.11 or newer, use JSON instead")
+            config = tomllib.load(f)
+        else:
+            config = json.load(f)
+    unknown = set(config) - {"defaults", "cameras"}
+    if unknown:
+        raise Exception(f"{path}: unknown section(s) {', '.join(sorted(unknown))}. Use defaults and cameras")
+    sections = [("defaults", config.get("defaults", {}))]
+    sections += [(f"cameras.{serial}", settings) for serial, settings in config.get("cameras", {}).items()]
+    for name, settings in sections:
+        for key, value in settings.items():
+            if key not in CAMERA_SETTINGS:
+                raise Exception(f"{path}: unknown setting {name}.{key}. Use one of {', '.join(CAMERA_SETTINGS)}")
+            kind = CAMERA_SETTINGS[key]
+            # bool is an int subclass, so true/false would otherwise pass as 1/0
+            if value is not None and (isinstance(value, bool) or
+                                      not (isinstance(value, kind) or (kind is float and isinstance(value, int)))):
+                raise Exception(f"{path}: {name}.{key} must be {kind.__name__}, not {value!r}")
+        if settings.get("white_balance", "once") not in WHITE_BALANCE:
+            raise Exception(f"{path}: {name}.white_balance must be one of {WHITE_BALANCE}")
+        if settings.get("field_of_view", "crop") not in ("crop", "full"):
+            raise Exception(f"{path}: {name}.field_of_view must be crop or full")
+    return {"defaults": dict(config.get("defaults", {})),
+            "cameras": {str(serial): dict(settings) for serial, settings in config.get("cameras", {}).items()}}
+
+
+def _same_value(current, wanted):
+    # Feature values read back from a camera: floats to within the camera's rounding
+    if isinstance(wanted, float) or isinstance(current, float):
+        return abs(current - wanted) <= max(1e-3, abs(wanted) * 1e-4)
+    return int(current) == int(wanted)
+
+
+class Recorder:
+    MODES = ("round_robin", "per_camera", "callback")
+    ENCODERS = ("thread", "process")
+    TRIGGERS = ("Line0", "Line1", "Line2", "Software")
+    PREVIEWS = ("windows", "mosaic", "http")
+    LIVE_SETTINGS = {"gain": "gain", "exposure_time": "exposure_time", "fps": "acquisition_frame_rate"}  # Writable while streaming
+    GEOMETRY_SETTINGS = ("width", "height", "offset_x", "offset_y", "field_of_view")  # Need the stream stopped
+    PROFILE_VERSION = 2  # Bump when _configure_camera changes what it sets, so cached profiles are rebuilt
+
+    def __init__(self, acquisition_mode="round_robin", encoder_backend="thread", buffer_count=None, latency_budget=0.5,
+                 raw_bayer=False, chunk_data=False, trigger_source=None, width=1224, height=1024, fps=25, preview=True,
+                 field_of_view="crop", preview_fps=10, preview_port=8080, profile_dir="profiles", refresh_profiles=False,
+                 camera_config=None):
+        if acquisition_mode not in self.MODES:
+            raise Exception(f"Unknown acquisition mode {acquisition_mode}. Use one of {self.MODES}")
+        if encoder_backend not in self.ENCODERS:
+            raise Exception(f"Unknown encoder backend {encoder_backend}. Use one of {self.ENCODERS}")
+        if trigger_source is not None and trigger_source not in self.TRIGGERS:
+            raise Exception(f"Unknown trigger source {trigger_source}. Use one of {self.TRIGGERS}")
+        if preview is True:
+            preview = "windows"
+        if preview and preview not in self.PREVIEWS:
+            raise Exception(f"Unknown preview {preview}. Use one of {self.PREVIEWS}")
+        self.acquisition_mode = acquisition_mode  # One thread for all cameras, one thread per camera, or SDK callbacks
+        self.encoder_backend = encoder_backend  # Encode in this process, or in one process per camera
         self.recording = False  # Flag to indicate if recording is in progress
         self.writers = []  # List to hold video writer objects
         self.stop_event = threading.Event()  # Event to signal stopping of threads
-        self.thread = None  # Thread for capturing frames
         self.displaying = False  # Flag to indicate if camera display is active
         self.display_windows = []  # List to hold display window names
         self.filenames = []
-        self.width = 1224
-        self.height = 1024
-        self.fps = 25
+        self.output_dir = "output"  # Directory the recordings are written to
+        self.codec = "mp4v"  # Recording codec, a key of CODECS
+        self.codec_options = {}  # Overrides for the codec's settings, e.g. {"crf": 18, "threads": 4}
+        self.segment_seconds = 0  # Start a new file every N seconds, N frames or N MB per camera (0 = never)
+        self.segment_frames = 0
+        self.segment_mb = 0
+        self.manifest = None  # Segment list of the current recording session
+        self.segments = []  # Segments of the last finished recording, as listed in its manifest
+        self.mono_codec = None  # Codec for monochrome cameras, e.g. "ffv1" for lossless gray; None to use codec
+        self.prerolls = {}  # Camera index -> PrerollBuffer, see start_preroll()
+        self.shared_publisher = None  # SharedFramePublisher, see start_shared_preview()
+        self.profile_dir = profile_dir  # Cached camera settings (save_parameter files), None to configure every camera from scratch
+        self.refresh_profiles = refresh_profiles  # Rebuild the cached profiles, e.g. to redo the one-shot white balance
+        self.camera_config = camera_config or {"defaults": {}, "cameras": {}}  # See load_camera_config()
+        self.width = width
+        self.height = height
+        self.fps = fps
         self.dB = 19.5
-        self.xOffset = int(float(self.width) / 2.0)
-        self.yOffset = int(float(self.height) / 2.0)
+        self.field_of_view = field_of_view  # "crop": centred ROI at full resolution, "full": whole sensor via binning/decimation
+        self.buffer_count = buffer_count  # Stream ring buffer size per camera (1-128), None to size it from fps and latency_budget
+        self.buffer_counts = {}  # Per-camera overrides, e.g. {0: 32}
+        self.chunk_data = chunk_data  # Read ChunkFrameID/ExposureTime/Gain from every frame
+        self.raw_bayer = raw_bayer  # Queue color frames as raw Bayer and demosaic later, off the acquisition thread
+        # GenICam names the Bayer pattern from the first pixel, OpenCV from the second row, hence the swap
+        self.bayer_codes = {
+            pytelicam.CameraPixelFormat.BayerRG8: cv2.COLOR_BayerBG2BGR,
+            pytelicam.CameraPixelFormat.BayerGR8: cv2.COLOR_BayerGB2BGR,
+            pytelicam.CameraPixelFormat.BayerGB8: cv2.COLOR_BayerGR2BGR,
+            pytelicam.CameraPixelFormat.BayerBG8: cv2.COLOR_BayerRG2BGR,
+        }
+        self.latency_budget = latency_budget  # Worst-case consumer hiccup in seconds the ring buffer must absorb
+        self.preview_fps = preview_fps  # Preview refresh rate, 0 to show every frame the cameras deliver
+        self.preview_consumer = None
+        self.preview_shown = 0  # Frames resized and shown
+        self.preview_cpu = 0.0  # CPU seconds used by the preview thread
+        self.preview_layout = preview or "windows"  # A window per camera, every camera tiled into one window, or HTTP
+        self.preview_port = preview_port  # Local port of the MJPEG preview server
+        self.preview_server = None
+        self.preview_size = (320, 240)  # Size of each camera's preview
+        self.mosaic_show = LatencyStats()  # imshow + waitKey of the whole mosaic
+        self.record_queue_depth = 64  # Frames a camera's encoder may fall behind before the drop policy applies
+        self.record_drop_policy = "block"  # Recording must not lose frames, so acquisition waits by default
+        self.record_queue_config = {}  # Per-camera overrides, e.g. {2: {"depth": 16, "policy": "drop_oldest"}}
+        self.frame_writers = []  # Encoder workers, one per camera
+        self.shm_slots = 8  # Shared-memory frame slots per camera for the process encoder
+
+        self.consumers = []  # Frame consumers fed by the acquisition stage
+        self.consumers_lock = threading.Lock()
+        self.acquiring = False  # Flag to indicate if the acquisition thread is running
+        self.acquisition_threads = []
+        self.dispatch_queues = []  # Callback mode: frames the SDK callback copied out, one queue per camera
+        self.signal_timeout = 1000  # Milliseconds without a frame before a camera counts as stalled
+        self.trigger_source = trigger_source  # None to free-run, else a shared hardware line or "Software"
+        self.frame_sets = None  # Assembles per-trigger frame sets in synchronized mode
+        self.triggering = False
+        self.trigger_thread = None
+        self.trigger_count = 0  # Software triggers issued
+        self.trigger_spread = LatencyStats()  # Time to issue one software trigger to every camera
+        self.frame_set_trigger_base = 0  # Software triggers issued before the current frame sets started
 
         # Initialize the camera system using the U3V interface
         self.cam_system = pytelicam.get_camera_system(int(pytelicam.CameraType.U3v))
@@ -50,68 +1527,907 @@ class Recorder:
         else:
             print(f"Detected {self.cam_num} camera(s)")
 
+        self.last_buffer_index = [-1] * self.cam_num  # Last ring buffer slot read from each camera
+        self.cam_stats = [CameraStats() for _ in range(self.cam_num)]
+        self.chunk_enabled = [False] * self.cam_num  # Cameras that attach chunk data to their frames
+        self.record_id_counts = []  # Frame ID counters at the start of the current recording
+
         # Create device objects and signal objects for each camera
+        self.serials = []  # Serial number of each camera
         for i in range(self.cam_num):
             self.cam_devices.append(self.cam_system.create_device_object(i))
             self.receive_signals.append(self.cam_system.create_signal())
+            self.serials.append(self.cam_system.get_camera_information(i).cam_serial_number)
+        self.profile_loaded = [False] * self.cam_num  # Cameras restored from a cached profile
+
+        # Per-camera settings: the constructor arguments, then the config file's defaults, then its overrides by serial
+        defaults = {"width": self.width, "height": self.height, "fps": self.fps, "gain": self.dB, "exposure_time": None,
+                    "white_balance": "once", "offset_x": None, "offset_y": None, "field_of_view": self.field_of_view}
+        defaults.update(self.camera_config["defaults"])
+        self.width, self.height, self.fps, self.dB = defaults["width"], defaults["height"], defaults["fps"], defaults["gain"]
+        self.field_of_view = defaults["field_of_view"]
+        self.camera_settings = [{**defaults, **self.camera_config["cameras"].get(serial, {})} for serial in self.serials]
+        for serial in sorted(set(self.camera_config["cameras"]) - set(self.serials)):
+            print(f"Config: no camera with serial {serial}, its settings are not used")
+        self.frame_sizes = [(settings["width"], settings["height"]) for settings in self.camera_settings]  # Size each camera delivers, resized on the host if it differs
+        self.feature_writes = [collections.Counter() for _ in range(self.cam_num)]  # Features "written" and "skipped" (already set)
+        self.verification = [[] for _ in range(self.cam_num)]  # Settings read back from each camera, see verify_camera()
         
-        # Open each camera device and configure it
-        for i,device in enumerate(self.cam_devices):
-            device.open()  # Open the camera device
+        # Open and configure every camera at once. Each camera's SDK calls only touch its own
+        # device, so startup takes about as long as the slowest camera rather than the sum,
+        # and a camera that fails is left out instead of stopping the rig.
+        start = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.cam_num) as pool:
+            results = list(pool.map(self._start_camera, range(self.cam_num)))
+        self.startup_time = time.monotonic() - start
+        for i, (error, elapsed, notes) in enumerate(results):
+            if error is None:
+                print(f"Camera {i}: ready in {elapsed:.2f} s | " + " | ".join(notes))
+            else:
+                print(f"Camera {i}: failed after {elapsed:.2f} s, continuing without it | {error}")
+        started = [i for i, (error, _, _) in enumerate(results) if error is None]
+        self.profile_hits = sum(self.profile_loaded[i] for i in started)
+        print(f"Started {len(started)} of {self.cam_num} camera(s) in {self.startup_time:.2f} s "
+              f"(sum of per-camera times {sum(elapsed for _, elapsed, _ in results):.2f} s, "
+              f"{self.profile_hits} from cached profiles)")
+        if not started:
+            print("No camera could be started. Exiting application.")
+            self.cam_system.terminate()
+            sys.exit()
+        if len(started) < self.cam_num:
+            self._drop_failed_cameras(started)
+        self.startup_times = [results[i][1] for i in started]  # Seconds each camera took to open and configure
+        self.print_verification()
+        self.paused = [False] * self.cam_num  # Cameras whose stream is being reconfigured, see restart_camera()
+        self.camera_locks = [threading.Lock() for _ in range(self.cam_num)]  # Held while a camera's buffers are read
+        for i in range(self.cam_num):
+            self._start_stream(i)
 
-            res = device.cam_control.set_trigger_mode(False)  # Disable hardware trigger mode for continuous acquisition
+        if self.trigger_source is not None:
+            self._start_frame_sets()
+        self.start_acquisition()
+        self.start_triggers()  # Start pulling frames from the cameras
+        if preview:
+            self.start_display()  # Start displaying the camera feeds
+
+    def _start_camera(self, i):
+        # Runs on a worker thread per camera: (error or None, seconds taken, notes)
+        start = time.monotonic()
+        try:
+            notes = self._configure_camera(i)
+        except Exception as e:  # pytelicam.PytelicamError, or a failed status check below
+            self._release_camera(i)
+            return f"{type(e).__name__}: {e}", time.monotonic() - start, []
+        return None, time.monotonic() - start, notes
+
+    def _configure_camera(self, i):
+        # Open camera i, apply its settings and allocate its stream buffers. Features the camera
+        # already has are not written again. Returns what was configured.
+        device = self.cam_devices[i]
+        settings = self.camera_settings[i]
+        device.open()  # Open the camera device
+        notes = []
+        profile = self._profile_path(i)
+        if profile is not None and not self.refresh_profiles and self._load_profile(i, profile, notes):
+            wrong = [row["feature"] for row in self.verify_camera(i) if not row["ok"]]
+            if not wrong:
+                notes.append(self._allocate_stream(i))
+                return notes
+            # The camera didn't take the profile as saved (firmware update, another tool changed
+            # it): drop it and configure every feature, which caches a fresh one
+            notes[:] = [f"cached profile left {', '.join(wrong)} wrong, configured from scratch"]
+            self._drop_profile(profile)
+            self.profile_loaded[i] = False
+            self.chunk_enabled[i] = False
+
+        if self.trigger_source is None:
+            res = self._write_feature(i, "trigger_mode", False)  # Disable hardware trigger mode for continuous acquisition
             if res != pytelicam.CamApiStatus.Success:
                 raise Exception("Can't set TriggerMode.")  # Raise an exception if unable to set trigger mode
+        else:
+            self._enable_trigger(i)  # Expose one frame per shared trigger
 
-            res = self.cam_devices[i].cam_control.set_width(self.width)  # set the width of the camera feed
-            if res != pytelicam.CamApiStatus.Success:
-                raise Exception(f"Can't set width. {res}")
+        geometry = self._configure_geometry(i, settings["width"], settings["height"])  # set the size of the camera feed
+        notes.append(geometry)
 
-            res = self.cam_devices[i].cam_control.set_height(self.height)  # set the height of the camera feed
-            if res != pytelicam.CamApiStatus.Success:
-                raise Exception(f"Can't set height. {res}")
+        res = self._write_feature(i, "acquisition_frame_rate_control", pytelicam.pytelicam.CameraAcqFrameRateCtrl.Manual)
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't set cam ctrl. {res}")
 
-            res = self.cam_devices[i].cam_control.set_acquisition_frame_rate_control(pytelicam.pytelicam.CameraAcqFrameRateCtrl.Manual)
-            if res != pytelicam.CamApiStatus.Success:
-                raise Exception(f"Can't set cam ctrl. {res}")
+        res = self._write_feature(i, "acquisition_frame_rate", settings["fps"])  # set the frame rate of the camera
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't set aquisition fps. Camera {i} | {res}")
 
-            res = self.cam_devices[i].cam_control.set_acquisition_frame_rate(self.fps)  # set the frame rate of the camera
-            if res != pytelicam.CamApiStatus.Success:
-                raise Exception(f"Can't set aquisition fps. Camera {i} | {res}")
+        res = self._write_feature(i, "gain", settings["gain"])
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't set gain auto setting. Camera {i} | {res}")
 
-            #debug stuff
-            res, mode = self.cam_devices[i].cam_control.get_acquisition_frame_rate_control()
+        if settings["exposure_time"] is not None:
+            res = self._write_feature(i, "exposure_time", settings["exposure_time"])
             if res != pytelicam.CamApiStatus.Success:
-                raise Exception(f"Can't set cam ctrl. {res}")
-            print(mode) #debugging
+                raise Exception(f"Can't set exposure time. Camera {i} | {res}")
 
-            res,fps = self.cam_devices[i].cam_control.get_acquisition_frame_rate()  # set the frame rate of the camera
+        if not self.is_mono(i):  # Monochrome sensors have no white balance
+            if settings["white_balance"] == "once":
+                # A one-shot is an action rather than a value, so it runs every time
+                res = device.cam_control.set_balance_white_auto(pytelicam.CameraBalanceWhiteAuto.Once)
+                self.feature_writes[i]["written"] += 1
+            else:
+                res = self._write_feature(i, "balance_white_auto",
+                                          getattr(pytelicam.CameraBalanceWhiteAuto, settings["white_balance"].capitalize()))
             if res != pytelicam.CamApiStatus.Success:
-                raise Exception(f"Can't set aquisition fps. Camera {i} | {res}")
-            print(fps) #debugging
-            #end debug
+                raise Exception(f"Can't set white balance auto setting. Camera {i} | {res}")
 
-            res = self.cam_devices[i].cam_control.set_offset_x(self.xOffset)
-            if res != pytelicam.CamApiStatus.Success:
-                raise Exception(f"Can't set xoffset setting. Camera {i} | {res}")
+        if self.chunk_data:
+            self.chunk_enabled[i] = self._enable_chunks(i)
 
-            res = self.cam_devices[i].cam_control.set_offset_y(self.yOffset)
-            if res != pytelicam.CamApiStatus.Success:
-                raise Exception(f"Can't set yoffset setting. Camera {i} | {res}")
+        self.verify_camera(i)
+        if profile is not None:
+            self._save_profile(i, profile, geometry, notes)
+        writes = self.feature_writes[i]
+        notes.append(f"{writes['written']} feature(s) written, {writes['skipped']} already set")
+        notes.append(self._allocate_stream(i))
+        return notes
 
-            res = self.cam_devices[i].cam_control.set_gain(self.dB)
-            if res != pytelicam.CamApiStatus.Success:
-                raise Exception(f"Can't set gain auto setting. Camera {i} | {res}")
+    def _read_feature(self, i, name):
+        # Current value of cam_control feature `name` on camera i, None if it can't be read
+        res, value = getattr(self.cam_devices[i].cam_control, f"get_{name}")()
+        return value if res == pytelicam.CamApiStatus.Success else None
+
+    def _write_feature(self, i, name, value):
+        # Set cam_control feature `name` on camera i unless it already has value, which saves a
+        # USB round trip and keeps features that would restart the camera's pipeline untouched
+        current = self._read_feature(i, name)
+        if current is not None and _same_value(current, value):
+            self.feature_writes[i]["skipped"] += 1
+            return pytelicam.CamApiStatus.Success
+        self.feature_writes[i]["written"] += 1
+        return getattr(self.cam_devices[i].cam_control, f"set_{name}")(value)
+
+    def verify_camera(self, i):
+        # Read back every setting camera i was given: [{"feature", "wanted", "actual", "ok"}]
+        settings = self.camera_settings[i]
+        checks = [("width", "width", self.frame_sizes[i][0]), ("height", "height", self.frame_sizes[i][1]),
+                  ("trigger", "trigger_mode", self.trigger_source is not None),
+                  ("frame rate control", "acquisition_frame_rate_control", pytelicam.pytelicam.CameraAcqFrameRateCtrl.Manual),
+                  ("fps", "acquisition_frame_rate", settings["fps"]), ("gain", "gain", settings["gain"])]
+        if settings["exposure_time"] is not None:
+            checks.append(("exposure", "exposure_time", settings["exposure_time"]))
+        if settings["white_balance"] != "once" and not self.is_mono(i):
+            checks.append(("white balance", "balance_white_auto",
+                           getattr(pytelicam.CameraBalanceWhiteAuto, settings["white_balance"].capitalize())))
+        if self.chunk_enabled[i]:
+            checks.append(("chunks", "chunk_mode_active", True))
+        rows = []
+        for feature, name, wanted in checks:
+            actual = self._read_feature(i, name)
+            rows.append({"feature": feature, "wanted": wanted, "actual": actual,
+                         "ok": actual is not None and _same_value(actual, wanted)})
+        self.verification[i] = rows
+        return rows
+
+    def print_verification(self, cams=None):
+        # The settings every camera reports, flagging the ones that differ from what it was given
+        describe = lambda value: getattr(value, "name", f"{value:g}" if isinstance(value, float) else value)
+        for i, rows in enumerate(self.verification):
+            if cams is not None and i not in cams:
+                continue
+            values = [f"{row['feature']} {describe(row['actual'])}" + ("" if row["ok"] else f" (wanted {describe(row['wanted'])})")
+                      for row in rows]
+            failed = sum(not row["ok"] for row in rows)
+            print(f"Camera {i} ({self.serials[i]}): {'as configured' if not failed else f'{failed} MISMATCH(ES)'} | " +
+                  " | ".join(values))
+
+    def _profile_settings(self, i):
+        # Everything _configure_camera applies to camera i; a cached profile is only used if these match
+        return {"version": self.PROFILE_VERSION, "trigger_source": self.trigger_source, "chunk_data": self.chunk_data,
+                **self.camera_settings[i]}
+
+    def _profile_path(self, i):
+        # <profile_dir>/<serial>_<settings hash>.txt, the SDK wants an absolute path
+        if not self.profile_dir:
+            return None
+        key = hashlib.sha1(json.dumps(self._profile_settings(i), sort_keys=True).encode()).hexdigest()[:12]
+        return os.path.abspath(os.path.join(self.profile_dir, f"{self.serials[i]}_{key}.txt"))
+
+    def _load_profile(self, i, path, notes):
+        # Restore camera i with one load_parameter instead of setting every feature, including
+        # the slow one-shot white balance. Returns False if it has to be configured from scratch.
+        info_path = os.path.splitext(path)[0] + ".json"  # What the camera settings don't say: host-side resize, chunks
+        if not os.path.exists(path) or not os.path.exists(info_path):
+            notes.append("no cached profile")
+            return False
+        start = time.monotonic()
+        try:
+            with open(info_path) as f:
+                info = json.load(f)
+            self.cam_devices[i].load_parameter(path)
+        except (OSError, ValueError, pytelicam.PytelicamError) as e:
+            notes.append(f"cached profile unusable ({e})")
+            return False
+        control = self.cam_devices[i].cam_control
+        res_w, width = control.get_width()
+        res_h, height = control.get_height()
+        if (res_w, res_h) != (pytelicam.CamApiStatus.Success,) * 2 or [width, height] != info["frame_size"]:
+            notes.append("cached profile did not restore the ROI")
+            return False
+        self.frame_sizes[i] = tuple(info["frame_size"])
+        self.chunk_enabled[i] = info["chunk_enabled"]
+        self.profile_loaded[i] = True
+        notes.append(info["geometry"])
+        notes.append(f"restored from cached profile in {time.monotonic() - start:.2f} s")
+        return True
+
+    @staticmethod
+    def _drop_profile(path):
+        for file in (path, os.path.splitext(path)[0] + ".json"):
+            if os.path.exists(file):
+                os.remove(file)
+
+    def _save_profile(self, i, path, geometry, notes):
+        # Cache camera i's settings for the next start and drop its profiles for other settings
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.cam_devices[i].save_parameter(path)
+            with open(os.path.splitext(path)[0] + ".json", "w") as f:
+                json.dump({"serial": self.serials[i], "settings": self._profile_settings(i), "geometry": geometry,
+                           "frame_size": list(self.frame_sizes[i]), "chunk_enabled": self.chunk_enabled[i]}, f, indent=1)
+        except (OSError, pytelicam.PytelicamError) as e:
+            notes.append(f"can't cache profile ({e})")
+            return
+        name = os.path.basename(os.path.splitext(path)[0])
+        for old in os.listdir(os.path.dirname(path)):
+            if old.startswith(f"{self.serials[i]}_") and os.path.splitext(old)[0] != name:
+                os.remove(os.path.join(os.path.dirname(path), old))
+        notes.append("profile cached")
+
+    def _release_camera(self, i):
+        # Close whatever a failed camera got to open
+        device = self.cam_devices[i]
+        try:
+            if device.cam_stream.is_open:
+                device.cam_stream.close()
+            if device.is_open:
+                device.close()
+        except Exception as e:
+            print(f"Camera {i}: can't close after the failure | {e}")
+
+    def _drop_failed_cameras(self, started):
+        # Renumber the cameras that started as 0..n-1 and forget the others
+        for i in range(self.cam_num):
+            if i not in started:
+                self.cam_system.close_signal(self.receive_signals[i])
+        print("Camera numbers from here on: " + ", ".join(f"{n} (was {i})" for n, i in enumerate(started)))
+        self.cam_devices = [self.cam_devices[i] for i in started]
+        self.receive_signals = [self.receive_signals[i] for i in started]
+        self.serials = [self.serials[i] for i in started]
+        self.profile_loaded = [self.profile_loaded[i] for i in started]
+        self.camera_settings = [self.camera_settings[i] for i in started]
+        self.feature_writes = [self.feature_writes[i] for i in started]
+        self.verification = [self.verification[i] for i in started]
+        self.cam_stats = [self.cam_stats[i] for i in started]
+        self.frame_sizes = [self.frame_sizes[i] for i in started]
+        self.chunk_enabled = [self.chunk_enabled[i] for i in started]
+        self.cam_num = len(started)
+        self.last_buffer_index = [-1] * self.cam_num
 
-            res = self.cam_devices[i].cam_control.set_balance_white_auto(
-                pytelicam.CameraBalanceWhiteAuto.Once)
+    def _open_stream(self, i):
+        print(f"Camera {i}: {self._allocate_stream(i)}")
+        self._start_stream(i)
+
+    def _allocate_stream(self, i):
+        device = self.cam_devices[i]
+        buffer_count = self.stream_buffer_count(i)
+        self.cam_stats[i].buffer_count = buffer_count
+        device.cam_stream.open(self.receive_signals[i], buffer_count)  # Open the camera stream
+        res, payload = device.cam_control.get_stream_payload_size()
+        if res != pytelicam.CamApiStatus.Success:
+            return f"{buffer_count} stream buffer(s)"
+        return f"{buffer_count} stream buffer(s), {buffer_count * payload / 1e6:.1f} MB"
+
+    def _start_stream(self, i):
+        device = self.cam_devices[i]
+        # Count frames the SDK loses instead of losing them silently
+        device.cam_stream.set_callback_image_error(lambda status, index, i=i: self._on_image_error(i, status, index))
+        device.cam_stream.set_callback_buffer_busy(lambda index, i=i: self._on_buffer_busy(i, index))
+        self.last_buffer_index[i] = -1
+        device.cam_stream.start()  # Start the camera stream
+
+    def _start_frame_sets(self):
+        # Every camera is streaming and waiting, so the first trigger yields the first frame of each
+        self.frame_sets = FrameSetAssembler(self.cam_num, self.add_consumer("frame sets", depth=self.record_queue_depth * self.cam_num, policy="block"),
+                                            period=1.0 / self.fps)
+        self.frame_set_trigger_base = self.trigger_count
+        for preroll in self.prerolls.values():
+            self.frame_sets.add_output(preroll)
+        self.frame_sets.start()
+
+    def _configure_geometry(self, i, width, height):
+        # Make camera i deliver width x height frames the cheapest way it can: a sensor ROI
+        # (centred unless the camera's settings give offsets), after binning or decimation when
+        # its field_of_view is "full", and host-side resizing only for what the camera can't do.
+        # Only features that change are written, in an order where every intermediate ROI fits.
+        # The stream must be stopped. Returns how the size was reached.
+        settings = self.camera_settings[i]
+        control = self.cam_devices[i].cam_control
+        res, sensor_width = control.get_sensor_width()
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't get sensor width. Camera {i} | {res}")
+        res, sensor_height = control.get_sensor_height()
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't get sensor height. Camera {i} | {res}")
+        factors = {"binning": ("binning_horizontal", "binning_vertical"),
+                   "decimation": ("decimation_horizontal", "decimation_vertical")}
+        supported = {}  # Largest usable factor of each kind
+        for name, (horizontal, vertical) in factors.items():
+            res_h, _, max_h = getattr(control, f"get_{horizontal}_min_max")()
+            res_v, _, max_v = getattr(control, f"get_{vertical}_min_max")()
+            if res_h == pytelicam.CamApiStatus.Success and res_v == pytelicam.CamApiStatus.Success:
+                supported[name] = min(max_h, max_v)
+        candidates = []
+        if settings["field_of_view"] == "full":
+            # Binning first (it adds light), else decimation: the largest factor that still covers the request
+            for name in ("binning", "decimation"):
+                factor = max([f for f in (4, 2) if f <= supported.get(name, 1)
+                              and sensor_width // f >= width and sensor_height // f >= height], default=1)
+                if factor > 1:
+                    candidates.append((name, factor))
+        candidates.append((None, 1))  # Plain sensor ROI
+        current = {axis: self._read_feature(i, axis) for name in supported for axis in factors[name]}
+        for chosen, factor in candidates:
+            wanted = {axis: factor if name == chosen else 1 for name in supported for axis in factors[name]}
+            if any(current[axis] != value for axis, value in wanted.items()):
+                self._write_feature(i, "offset_x", 0)  # The area changes, start from the corner so any ROI fits
+                self._write_feature(i, "offset_y", 0)
+            results = [self._write_feature(i, axis, value) for axis, value in wanted.items()]
+            current = {axis: self._read_feature(i, axis) for axis in wanted}
+            if all(res == pytelicam.CamApiStatus.Success for res in results):
+                break
+        method = "sensor ROI" if chosen is None else f"{factor}x{factor} {chosen} + sensor ROI"
+        area = (sensor_width // factor, sensor_height // factor)
+
+        res, width_min, width_max, width_inc = control.get_width_min_max()
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't get width range. Camera {i} | {res}")
+        res, height_min, height_max, height_inc = control.get_height_min_max()
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't get height range. Camera {i} | {res}")
+        if settings["field_of_view"] == "full" and chosen is None:
+            roi = (area[0] // width_inc * width_inc, area[1] // height_inc * height_inc)  # Nothing fits, scale the whole sensor on the host
+        else:
+            # Round up to the camera's increments; anything left over is resized on the host
+            roi = (min(max(ceil(width / width_inc) * width_inc, width_min), area[0] // width_inc * width_inc),
+                   min(max(ceil(height / height_inc) * height_inc, height_min), area[1] // height_inc * height_inc))
+        offsets = []
+        for axis, wanted, size, limit in (("x", settings["offset_x"], roi[0], area[0]), ("y", settings["offset_y"], roi[1], area[1])):
+            _, _, _, inc = getattr(control, f"get_offset_{axis}_min_max")()
+            offset = (limit - size) // 2 if wanted is None else min(max(wanted, 0), limit - size)  # Centre the ROI unless configured
+            offsets.append(offset // inc * inc)
+
+        # Move the ROI to the corner first where the current offset would push the new size off the sensor
+        if (self._read_feature(i, "offset_x") or 0) + roi[0] > area[0]:
+            self._write_feature(i, "offset_x", 0)
+        if (self._read_feature(i, "offset_y") or 0) + roi[1] > area[1]:
+            self._write_feature(i, "offset_y", 0)
+        res = self._write_feature(i, "width", roi[0])  # set the width of the camera feed
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't set width. {res}")
+        res = self._write_feature(i, "height", roi[1])  # set the height of the camera feed
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't set height. {res}")
+        res = self._write_feature(i, "offset_x", offsets[0])
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't set xoffset setting. Camera {i} | {res}")
+        res = self._write_feature(i, "offset_y", offsets[1])
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't set yoffset setting. Camera {i} | {res}")
+
+        self.frame_sizes[i] = roi
+        if settings["offset_x"] is not None or settings["offset_y"] is not None:
+            method += f" at {offsets[0]},{offsets[1]}"
+        if roi != (width, height):
+            method += f", host resize from {roi[0]}x{roi[1]}"
+        return f"{width}x{height} via {method}"
+
+    def apply_settings(self, cams=None, **changes):
+        # Change camera settings while the rig runs. Exposure, gain and frame rate are written
+        # to the running cameras; size, offsets and field of view go through restart_camera(),
+        # one camera at a time while the others keep streaming.
+        cams = list(range(self.cam_num)) if cams is None else list(cams)
+        unknown = set(changes) - set(self.LIVE_SETTINGS) - set(self.GEOMETRY_SETTINGS)
+        if unknown:
+            raise Exception(f"Unknown setting(s) {', '.join(sorted(unknown))}. Use {', '.join(self.LIVE_SETTINGS)} "
+                            f"or {', '.join(self.GEOMETRY_SETTINGS)}")
+        if "fps" in changes and not changes["fps"] > 0:
+            raise Exception(f"Frame rate must be above 0, not {changes['fps']}")
+        geometry = {key: value for key, value in changes.items() if key in self.GEOMETRY_SETTINGS}
+        if self.recording and (geometry or "fps" in changes):
+            print("Can't change the frame rate or geometry while recording")  # The files' size and rate are fixed
+            return False
+        rejected = set()  # Settings at least one camera refused
+        for i in cams:
+            start = time.monotonic()
+            written = []
+            for key, value in changes.items():
+                if key not in self.LIVE_SETTINGS:
+                    continue
+                res = self._write_feature(i, self.LIVE_SETTINGS[key], value)
+                if res != pytelicam.CamApiStatus.Success:
+                    print(f"Camera {i}: can't set {key} to {value:g} | {res}")
+                    rejected.add(key)
+                    continue
+                self.camera_settings[i][key] = value
+                written.append(f"{key} {value:g}")
+            if written:
+                print(f"Camera {i}: {', '.join(written)} in {(time.monotonic() - start) * 1000:.1f} ms, stream kept running")
+            if geometry:
+                self.restart_camera(i, **geometry)
+            self.verify_camera(i)
+        if "fps" in changes and len(cams) == self.cam_num:
+            self._update_rig_fps(changes["fps"], "fps" not in rejected)
+        self.print_verification(cams)
+        return True
+
+    def _update_rig_fps(self, fps, accepted):
+        # The rig rate drives the software trigger and the rate new recordings are written at, so
+        # it only becomes fps if every camera runs at it. Otherwise it is the slowest camera's rate.
+        rates = [self._read_feature(i, "acquisition_frame_rate") for i in range(self.cam_num)]
+        if accepted and all(rate is not None and _same_value(rate, fps) for rate in rates):
+            self.fps = fps
+        elif all(rate is not None and rate > 0 for rate in rates):
+            self.fps = min(rates)
+            print(f"Not every camera runs at {fps:g} fps, the rig rate is {self.fps:g} fps")
+        else:
+            print(f"Can't read the cameras' frame rates back, the rig rate stays {self.fps:g} fps")
+        if self.frame_sets is not None:
+            self.frame_sets.period = 1.0 / self.fps
+
+    def restart_camera(self, i, **geometry):
+        # The minimal stop/reconfigure/start cycle for a geometry change of camera i: only its
+        # stream stops while the other cameras keep delivering. A software trigger pauses for
+        # the restart so every frame set stays aligned. Reports the time to the first new frame.
+        device = self.cam_devices[i]
+        settings = self.camera_settings[i]
+        previous = dict(settings)
+        settings.update(geometry)
+        stopped = time.monotonic()
+        paused_triggers = self.trigger_source == "Software" and self.triggering
+        if paused_triggers:
+            self.stop_triggers()
+        self.paused[i] = True
+        try:
+            with self.camera_locks[i]:  # Let a buffer read that is under way finish
+                if device.cam_stream.is_open:  # Closed if an earlier restart failed
+                    if self.acquisition_mode == "callback":
+                        device.cam_stream.reset_callback_image_acquired()
+                    device.cam_stream.stop()
+                    device.cam_stream.close()
+                try:
+                    description = self._configure_geometry(i, settings["width"], settings["height"])
+                except Exception as e:
+                    settings.clear()
+                    settings.update(previous)
+                    self._configure_geometry(i, settings["width"], settings["height"])
+                    description = f"kept {settings['width']}x{settings['height']}, {e}"
+                self._write_feature(i, "acquisition_frame_rate", settings["fps"])  # The frame rate range depends on the ROI
+                self.cam_stats[i].frame_ids.restart()
+                if self.frame_sets is not None:
+                    next_index = self.trigger_count - self.frame_set_trigger_base if paused_triggers else None
+                    self.frame_sets.resync(i, next_index, 1.0 / self.fps)
+                description += f" | {self._allocate_stream(i)}"
+                frames = self.cam_stats[i].frames
+                if self.acquisition_mode == "callback" and self.acquiring:
+                    device.cam_stream.set_callback_image_acquired(lambda image_data, i=i: self._on_image_acquired(i, image_data))
+                started = time.monotonic()
+                self._start_stream(i)
+            self.paused[i] = False
+            self.cam_stats[i].restart_error = None
+        except Exception as e:  # Neither geometry could be set, or the stream didn't reopen
+            # The camera stays paused with its stream closed; the others keep running and
+            # another geometry change retries it
+            self.cam_stats[i].restart_error = str(e)
+            print(f"Camera {i}: restart failed, the camera is stopped | {e}")
+            return None
+        finally:
+            if paused_triggers:
+                self.start_triggers()
+        preroll = self.prerolls.get(i)
+        if preroll is not None:
+            preroll.clear()  # Frames from before the change don't match the new view
+        while self.cam_stats[i].frames == frames and time.monotonic() - started < 5:
+            time.sleep(0.001)
+        if self.cam_stats[i].frames == frames:
+            print(f"Camera {i}: {description} | no frame within 5 s of the restart")
+            return None
+        first_frame = time.monotonic()
+        print(f"Camera {i}: {description} | first frame {(first_frame - started) * 1000:.0f} ms after start, "
+              f"{(first_frame - stopped) * 1000:.0f} ms without frames")
+        return first_frame - started
+
+    def set_resolution(self, width, height):
+        # Change the size every camera delivers, between recordings. Geometry can only change
+        # while a stream is stopped, and the payload size changes with it, so acquisition
+        # pauses and each stream is closed, reconfigured and reopened.
+        if self.recording:
+            print("Can't change the resolution while recording")
+            return False
+        self.stop_triggers()
+        self.stop_acquisition()
+        if self.frame_sets is not None:
+            self.remove_consumer(self.frame_sets.consumer)  # Its frame ID bookkeeping ends with the streams
+            self.frame_sets.join()
+            self.frame_sets = None
+        try:
+            for i, device in enumerate(self.cam_devices):
+                device.cam_stream.stop()
+                device.cam_stream.close()
+                self.camera_settings[i].update(width=width, height=height)
+                print(f"Camera {i}: {self._configure_geometry(i, width, height)}")
+                res = self._write_feature(i, "acquisition_frame_rate", self.camera_settings[i]["fps"])  # The frame rate range depends on the ROI
+                if res != pytelicam.CamApiStatus.Success:
+                    print(f"Can't set aquisition fps. Camera {i} | {res}")
+                self.cam_stats[i].frame_ids.restart()
+                self._open_stream(i)
+            self.width, self.height = width, height
+        finally:
+            for preroll in self.prerolls.values():
+                preroll.clear()  # Frames from before the change don't match the new view
+            if self.trigger_source is not None:
+                self._start_frame_sets()
+            self.start_acquisition()
+            self.start_triggers()
+        return True
+
+    def _enable_trigger(self, i):
+        res = self._write_feature(i, "trigger_mode", True)
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't set TriggerMode. Camera {i} | {res}")
+        source = getattr(pytelicam.pytelicam.CameraTriggerSource, self.trigger_source)
+        res = self._write_feature(i, "trigger_source", source)
+        if res != pytelicam.CamApiStatus.Success:
+            raise Exception(f"Can't set TriggerSource {self.trigger_source}. Camera {i} | {res}")
+        self._write_feature(i, "trigger_sequence", pytelicam.pytelicam.CameraTriggerSequence.Sequence0)  # Not every camera has sequences
+
+    def _enable_chunks(self, i):
+        # Ask the camera to attach frame ID, exposure time and gain to every frame
+        cam_control = self.cam_devices[i].cam_control
+        res = self._write_feature(i, "chunk_mode_active", True)
+        if res != pytelicam.CamApiStatus.Success:
+            print(f"Camera {i}: chunk data not supported ({res}), using stream block IDs")
+            return False
+        for selector in (pytelicam.CameraChunkSelector.BlockID, pytelicam.CameraChunkSelector.ExposureTime,
+                         pytelicam.CameraChunkSelector.Gain):
+            res = cam_control.set_chunk_enable(selector, True)
             if res != pytelicam.CamApiStatus.Success:
-                raise Exception(f"Can't set white balance auto setting. Camera {i} | {res}")
+                print(f"Camera {i}: can't enable chunk {selector}. {res}")
+        return True
 
-            device.cam_stream.open(self.receive_signals[i])  # Open the camera stream
-            device.cam_stream.start()  # Start the camera stream
+    def stream_buffer_count(self, i):
+        # Ring buffer size for camera i: explicit setting, or enough frames to ride out latency_budget
+        count = self.buffer_counts.get(i, self.buffer_count)
+        if not count:
+            count = ceil(self.camera_settings[i]["fps"] * self.latency_budget) + 2  # Plus the slot being filled and the slot being read
+        return max(1, min(128, int(count)))  # SDK limit
 
-        self.start_display()  # Start displaying the camera feeds
+    def add_consumer(self, name, cams=None, depth=2, policy="drop_oldest"):
+        # Register a new frame consumer with the acquisition stage
+        return self.attach_consumer(FrameConsumer(name, cams, depth, policy))
+
+    def attach_consumer(self, consumer):
+        with self.consumers_lock:
+            self.consumers.append(consumer)
+        return consumer
+
+    def attach_recording_consumer(self, consumer):
+        # In synchronized mode recordings are fed whole frame sets so every file stays aligned
+        if self.frame_sets is not None:
+            self.frame_sets.add_output(consumer)
+        else:
+            self.attach_consumer(consumer)
+
+    def remove_consumer(self, consumer):
+        # Detach a consumer; frames already queued stay available until drained
+        with self.consumers_lock:
+            if consumer in self.consumers:
+                self.consumers.remove(consumer)
+        if self.frame_sets is not None:
+            self.frame_sets.remove_output(consumer)
+        consumer.close()
+
+    def start_triggers(self):
+        # Drive the software trigger from the host clock at self.fps
+        if self.trigger_source != "Software" or self.triggering:
+            return
+        self.triggering = True
+        self.trigger_thread = threading.Thread(target=self._software_triggers)
+        self.trigger_thread.start()
+
+    def stop_triggers(self):
+        self.triggering = False
+        if self.trigger_thread is not None and self.trigger_thread.is_alive():
+            self.trigger_thread.join()
+
+    def _software_triggers(self):
+        next_time = time.monotonic()
+        while self.triggering:
+            period = 1.0 / self.fps  # Read every time, "set fps" changes it live
+            start = time.monotonic()
+            for i, device in enumerate(self.cam_devices):
+                res = device.genapi.execute_command('TriggerSoftware')  # Broadcast the trigger to every camera
+                if res != pytelicam.CamApiStatus.Success:
+                    print(f"Can't execute TriggerSoftware. Camera {i} | {res}")
+            self.trigger_spread.add(time.monotonic() - start)
+            self.trigger_count += 1
+            next_time += period  # Fixed schedule, so late wake-ups do not accumulate drift
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()  # Fell behind by more than a period, resynchronize
+
+    def record_queue_settings(self, i):
+        # Queue depth and drop policy for camera i's encoder queue
+        config = self.record_queue_config.get(i, {})
+        return config.get("depth", self.record_queue_depth), config.get("policy", self.record_drop_policy)
+
+    def _publish(self, frame):
+        # Hand one frame to every interested consumer
+        with self.consumers_lock:
+            consumers = list(self.consumers)
+        for consumer in consumers:
+            if consumer.wants(frame.cam):
+                consumer.put(frame)
+
+    def start_acquisition(self):
+        # Start the acquisition stage that takes every frame once
+        if self.acquiring:
+            return
+        self.acquiring = True
+        if self.acquisition_mode == "callback":
+            # The SDK calls back as soon as a frame is stored, no thread has to poll the signals.
+            # The callback only copies the frame out; a dispatcher thread per camera hands it to
+            # the consumers, so a "block" consumer never holds up the SDK's callback thread.
+            self.dispatch_queues = [FrameConsumer(f"dispatch cam{i}", [i], max(2, stats.buffer_count), "drop_oldest")
+                                    for i, stats in enumerate(self.cam_stats)]
+            self.acquisition_threads = [threading.Thread(target=self._dispatch_frames, args=(i,)) for i in range(self.cam_num)]
+            for i, device in enumerate(self.cam_devices):
+                device.cam_stream.set_callback_image_acquired(lambda image_data, i=i: self._on_image_acquired(i, image_data))
+        elif self.acquisition_mode == "per_camera":
+            # One worker per camera so a slow or stalled camera only holds up itself
+            self.acquisition_threads = [threading.Thread(target=self._acquire_camera, args=(i,)) for i in range(self.cam_num)]
+        else:
+            self.acquisition_threads = [threading.Thread(target=self._acquire_frames)]
+        for thread in self.acquisition_threads:
+            thread.start()
+
+    def stop_acquisition(self):
+        self.acquiring = False
+        if self.acquisition_mode == "callback":
+            for device in self.cam_devices:
+                if device.cam_stream.is_open:
+                    device.cam_stream.reset_callback_image_acquired()
+        for thread in self.acquisition_threads:
+            if thread.is_alive():
+                thread.join()  # Wait for the acquisition threads to finish
+        self.acquisition_threads = []
+
+    def _dispatch_frames(self, i):
+        # Callback mode: publish camera i's frames in the order the callback copied them out
+        dispatch = self.dispatch_queues[i]
+        while True:
+            frame = dispatch.get(timeout=0.1)
+            if frame is not None:
+                self._deliver(i, frame)
+            elif not self.acquiring:
+                break
+
+    def _acquire_frames(self):
+        # Only this thread waits on the camera signals, so frames are never split between consumers
+        while self.acquiring:
+            for i in range(self.cam_num):
+                if not self.acquiring:
+                    break
+                self._grab_camera(i)
+
+    def _acquire_camera(self, i):
+        # Per-camera worker, the only thread that waits on camera i's signal
+        while self.acquiring:
+            self._grab_camera(i)
+
+    def print_stats(self):
+        # Print per-camera acquisition rate and error counters
+        print(f"Startup: {self.startup_time:.2f} s | {self.profile_hits} of {self.cam_num} camera(s) from cached profiles")
+        for i, stats in enumerate(self.cam_stats):
+            print(f"Camera {i}: {stats.fps():.1f} fps | frames {stats.frames} | stalls {stats.stalls} | "
+                  f"signal errors {stats.signal_errors} | grab errors {stats.grab_errors} | "
+                  f"buffer busy {stats.buffer_busy} | image errors {stats.image_errors}")
+            print(f"  frame IDs: {FrameIdTracker.describe(stats.frame_ids.counts())}")
+            mean_backlog = stats.backlog_total / stats.visits if stats.visits else 0.0
+            print(f"  ring buffer: {stats.buffer_count} slot(s) | occupancy mean {mean_backlog:.2f} max {stats.backlog_max} | "
+                  f"full {stats.ring_full} | overruns {stats.overruns()}")
+            for name, stage in list(stats.stages.items()):
+                print(f"  {name:8s} {stage.summary()}")
+            if i < len(self.dispatch_queues) and self.dispatch_queues[i].dropped:
+                print(f"  dispatch: dropped {self.dispatch_queues[i].dropped} frame(s) the consumers could not take in time")
+            if stats.restart_error is not None:
+                print(f"  stopped, restart failed: {stats.restart_error}")
+            if self.recording and stats.encoder_error is not None:
+                print(f"  not recording, encoder stopped: {stats.encoder_error}")
+        with self.consumers_lock:
+            consumers = list(self.consumers)
+        if self.frame_sets is not None:
+            print(f"Frame sets: complete {self.frame_sets.complete} | incomplete {self.frame_sets.incomplete} | "
+                  f"late {self.frame_sets.late} | unaligned at start {self.frame_sets.unaligned} | "
+                  f"a period apart {self.frame_sets.misaligned} | skew {self.frame_sets.skew.summary()}")
+        if self.trigger_source == "Software":
+            print(f"Software triggers: {self.trigger_count} | issue {self.trigger_spread.summary()}")
+        if self.displaying and self.preview_layout == "mosaic":
+            print(f"Mosaic preview: {self.mosaic_show.count} update(s) | show {self.mosaic_show.summary()}")
+        if self.preview_server is not None:
+            print(f"Preview server: {self.preview_server.url} | clients {self.preview_server.clients} | "
+                  f"frames served {self.preview_server.served}")
+        if self.preview_consumer is not None:
+            report = self.preview_report()
+            rate = f"{self.preview_fps:g} fps" if self.preview_fps else "every frame"
+            print(f"Preview: {rate} | "
+                  f"shown {report['shown']} | skipped {report['skipped']} | thread CPU {report['cpu_s']:.2f} s "
+                  f"({report['cpu_per_frame_ms']:.2f} ms/frame) | saved ~{report['saved_cpu_s']:.2f} s")
+        for consumer in consumers:
+            if isinstance(consumer, PrerollBuffer):
+                continue
+            print(f"Consumer {consumer.name}: delivered {consumer.delivered} | dropped {consumer.dropped} | "
+                  f"queued {len(consumer.frames)}/{consumer.depth} | wait {consumer.queue_latency.summary()}")
+        for i, preroll in sorted(self.prerolls.items()):
+            print(f"Pre-roll camera {i}: {len(preroll)} frame(s), {preroll.duration():.1f}/{preroll.seconds:g} s | "
+                  f"{preroll.bytes / 1e6:.1f} MB (peak {preroll.peak_bytes / 1e6:.1f}, cap {preroll.max_bytes / 1e6:g}) | "
+                  f"{preroll.format} | evicted by cap {preroll.capped}")
+        if self.shared_publisher is not None:
+            for i, ring in sorted(self.shared_publisher.rings.items()):
+                print(f"Shared memory {ring.name}: published {self.shared_publisher.published[i]} | "
+                      f"{ring.slots} x {ring.slot_bytes / 1e6:.1f} MB | copy {ring.publish_latency.summary()}")
+
+    def preview_report(self):
+        # Preview work done and the CPU the skipped frames would have cost at the measured per-frame cost
+        shown, skipped = self.preview_shown, self.preview_consumer.dropped if self.preview_consumer else 0
+        per_frame = self.preview_cpu / shown if shown else 0.0
+        return {"fps": self.preview_fps, "shown": shown, "skipped": skipped, "cpu_s": self.preview_cpu,
+                "cpu_per_frame_ms": per_frame * 1000, "saved_cpu_s": skipped * per_frame}
+
+    def start_preroll(self, seconds, format="raw", max_mb=512, quality=90):
+        # Keep the last `seconds` of every camera in memory so start_recording can include them
+        self.stop_preroll()
+        for i in range(self.cam_num):
+            self.prerolls[i] = PrerollBuffer(i, seconds, format, max_mb, quality)
+            self.attach_recording_consumer(self.prerolls[i])
+        print(f"Pre-roll: {seconds:g} s per camera as {format}, capped at {max_mb:g} MB per camera")
+
+    def stop_preroll(self):
+        for preroll in self.prerolls.values():
+            self.remove_consumer(preroll)
+        self.prerolls = {}
+
+    def start_shared_preview(self, prefix="tcpapp", slots=4):
+        # Publish every camera's newest frame to the shared-memory ring "<prefix>_cam<N>",
+        # read it from other processes with SharedFrameReader
+        self.stop_shared_preview()
+        consumer = self.add_consumer("shared memory", depth=self.cam_num, policy="latest")
+        self.shared_publisher = SharedFramePublisher(consumer, prefix, slots)
+        print(f"Shared memory: publishing {', '.join(f'{prefix}_cam{i}' for i in range(self.cam_num))} ({slots} slots)")
+
+    def stop_shared_preview(self):
+        if self.shared_publisher is not None:
+            self.remove_consumer(self.shared_publisher.consumer)
+            self.shared_publisher.close()
+            self.shared_publisher = None
+
+    def _grab_camera(self, i):
+        if self.paused[i]:
+            time.sleep(0.005)  # Being reconfigured, nothing to wait for
+            return
+        start = time.monotonic()
+        # Waited for outside the camera lock, so restart_camera() never sits out signal_timeout
+        res = self.cam_system.wait_for_signal(self.receive_signals[i], self.signal_timeout)  # Wait for a signal from the camera
+        if res == pytelicam.CamApiStatus.Timeout:
+            self.cam_stats[i].stalls += 1
+            return
+        if res != pytelicam.CamApiStatus.Success:
+            self.cam_stats[i].signal_errors += 1
+            print(f"Signal error ! status = {res} camera: {i}")
+            return
+        self.cam_stats[i].stage("wait").add(time.monotonic() - start)  # Includes idle time between frames
+        with self.camera_locks[i]:  # restart_camera() waits for this before stopping the stream
+            if not self.paused[i]:
+                self._read_buffers(i)
+
+    def _read_buffers(self, i):
+        current_index = self.cam_devices[i].cam_stream.get_current_buffer_index()
+        if current_index < 0:
+            return
+        for index in self._pending_indices(i, current_index):
+            with self.cam_devices[i].cam_stream.get_buffered_image(index) as image_data:
+                frame = self._take_frame(i, image_data)
+            self._deliver(i, frame)  # Publish after the SDK buffer has been released
+
+    def _pending_indices(self, i, current_index):
+        # The signal is set (and the callback called) only once even if several frames
+        # arrived, so return every ring buffer slot filled since the last visit
+        last_index = self.last_buffer_index[i]
+        self.last_buffer_index[i] = current_index
+        if last_index < 0:
+            return [current_index]
+        buffer_count = self.cam_stats[i].buffer_count
+        count = (current_index - last_index) % buffer_count
+        self.cam_stats[i].record_backlog(count)
+        return [(last_index + n + 1) % buffer_count for n in range(count)]
+
+    def _take_frame(self, i, image_data):
+        if image_data.status != pytelicam.CamApiStatus.Success:
+            self.cam_stats[i].grab_errors += 1
+            return None
+        return self._copy_out(i, image_data)
+
+    def _deliver(self, i, frame):
+        if frame is not None:
+            self.cam_stats[i].record_frame(frame.received)
+            self.cam_stats[i].frame_ids.observe(frame.frame_id)
+            self._publish(frame)
+            self.cam_stats[i].stage("publish").add(time.monotonic() - frame.received)  # Includes consumers that block
+
+    def _on_image_acquired(self, i, image_data):
+        # Runs on the SDK's callback thread; the SDK releases image_data when this returns
+        if not self.acquiring or self.paused[i]:
+            return
+        indices = self._pending_indices(i, image_data.lock_buffer_index)
+        frames = []
+        for index in indices[:-1]:  # Slots filled before this one that had no callback of their own
+            with self.cam_devices[i].cam_stream.get_buffered_image(index) as missed:
+                frames.append(self._take_frame(i, missed))
+        frames.append(self._take_frame(i, image_data))
+        for frame in frames:
+            if frame is not None:
+                self.dispatch_queues[i].put(frame)  # Never blocks, see start_acquisition()
+
+    def _on_image_error(self, i, status, index):
+        self.cam_stats[i].image_errors += 1
+
+    def _on_buffer_busy(self, i, index):
+        self.cam_stats[i].buffer_busy += 1
+
+    def _copy_out(self, i, image_data):
+        # Copy the image out of the SDK buffer so it can be released right away
+        start = time.monotonic()
+        bayer_code = None
+        if image_data.pixel_format == pytelicam.CameraPixelFormat.Mono8:
+            image = np.array(image_data.get_ndarray(pytelicam.OutputImageType.Raw), copy=True)
+        elif self.raw_bayer and image_data.pixel_format in self.bayer_codes:
+            # One byte per pixel instead of three; demosaicing is left to the consumers
+            image = np.array(image_data.get_ndarray(pytelicam.OutputImageType.Raw), copy=True)
+            bayer_code = self.bayer_codes[image_data.pixel_format]
+        else:
+            image = image_data.get_ndarray(pytelicam.OutputImageType.Bgr24)  # Conversion already allocates a new array
+        frame = Frame(i, image, image_data.pixel_format, image_data.block_id, image_data.timestamp, bayer_code)
+        if self.chunk_enabled[i]:
+            self._read_chunks(i, image_data, frame)
+        self.cam_stats[i].stage("copy").add(time.monotonic() - start)
+        return frame
+
+    def _read_chunks(self, i, image_data, frame):
+        # Chunk data lives in the SDK buffer, so read it before the buffer is released
+        device = self.cam_devices[i]
+        try:
+            device.cam_stream.chunk_attach_buffer(image_data)
+        except pytelicam.PytelicamError:
+            self.cam_stats[i].grab_errors += 1
+            return
+        res, frame_id = device.genapi.get_int_value('ChunkFrameID')
+        if res == pytelicam.CamApiStatus.Success:
+            frame.frame_id = frame_id
+        res, exposure_time = device.genapi.get_float_value('ChunkExposureTime')
+        if res == pytelicam.CamApiStatus.Success:
+            frame.exposure_time = exposure_time
+        res, gain = device.genapi.get_float_value('ChunkGain')
+        if res == pytelicam.CamApiStatus.Success:
+            frame.gain = gain
 
     def start_display(self):
         # Start displaying the camera feeds in separate windows
@@ -120,80 +2436,215 @@ class Recorder:
             return
 
         self.displaying = True  # Set the displaying flag to true
-        self.display_windows = [f"Camera {i}" for i in range(self.cam_num)]  # Create window names for each camera
+        if self.preview_layout == "http":
+            # Headless: no HighGUI windows, clients pull MJPEG streams instead
+            try:
+                self.preview_server = PreviewServer(self, self.preview_port)
+            except OSError as e:
+                self.displaying = False
+                print(f"Can't start the preview server on port {self.preview_port}: {e}")
+                return
+            print(f"Camera preview served at {self.preview_server.url}")
+            return
+        if self.preview_layout == "mosaic":
+            self.display_windows = ["Cameras"]
+        else:
+            self.display_windows = [f"Camera {i}" for i in range(self.cam_num)]  # Create window names for each camera
             
         self.display_thread = threading.Thread(target=self._update_displays)  # Create a thread to update displays
         self.display_thread.start()  # Start the display thread
         print("Camera display started - type 'stop' to exit")  # Inform the user that display has started
 
     def _update_displays(self):
-        # Continuously update the display windows with frames from the cameras
+        # Continuously update the display windows with frames from the preview consumer
+        # The consumer holds only the newest frame of each camera: frames that arrive between two
+        # preview ticks replace each other untouched and are never demosaiced or resized
+        consumer = self.add_consumer("preview", depth=self.cam_num, policy="latest")
+        self.preview_consumer = consumer
+        self.preview_shown = 0
+        cpu_start = time.thread_time()
+        if self.preview_layout == "mosaic":
+            self._update_mosaic(consumer, cpu_start)
+        next_time = time.monotonic()
         while self.displaying:
-            for i, window in enumerate(self.display_windows):
-                res = self.cam_system.wait_for_signal(self.receive_signals[i])  # Wait for a signal from the camera
-                if res == pytelicam.CamApiStatus.Success:
-                    current_index = self.cam_devices[i].cam_stream.get_current_buffer_index()
-                    with self.cam_devices[i].cam_stream.get_buffered_image(current_index) as image_data:
-                        if image_data.status == pytelicam.CamApiStatus.Success:
-                            frame = None
-                            if image_data.pixel_format == pytelicam.CameraPixelFormat.Mono8:
-                                frame = image_data.get_ndarray(pytelicam.OutputImageType.Raw)
-                            else:
-                                frame = image_data.get_ndarray(pytelicam.OutputImageType.Bgr24) # Get the current frame as a NumPy array
-                            frame = cv2.resize(frame, dsize=(320, 240))
-                            cv2.imshow(window, frame)  # Display the frame in the corresponding window
-                        else:
-                            print("")
-                            #print(f"Grab error! status = {image_data.status} camera: {i}")
-                else:
-                    print(f"Signal error ! status = {res} camera: {i}")
+            next_time, frame = self._next_preview_frame(consumer, next_time)
+            shown = False
+            while frame is not None:
+                if frame.cam < len(self.display_windows):
+                    start = time.monotonic()
+                    image = cv2.resize(frame.demosaiced(), dsize=self.preview_size)
+                    resized = time.monotonic()
+                    cv2.imshow(self.display_windows[frame.cam], image)  # Display the frame in the corresponding window
+                    cv2.waitKey(1)
+                    self.cam_stats[frame.cam].stage("resize").add(resized - start)
+                    self.cam_stats[frame.cam].stage("show").add(time.monotonic() - resized)
+                    self.preview_shown += 1
+                    shown = True
+                frame = consumer.get(timeout=0) if self.preview_fps else None
+            if not shown:
+                cv2.waitKey(1)
+            self.preview_cpu = time.thread_time() - cpu_start
+        self.remove_consumer(consumer)
+
+    def _next_preview_frame(self, consumer, next_time):
+        # Without a preview rate, wait for the next frame. With one, keep the windows responsive
+        # until the next tick and then take whatever is queued, one frame per camera at most
+        if not self.preview_fps:
+            return next_time, consumer.get(timeout=0.05)
+        next_time += 1.0 / self.preview_fps
+        delay = next_time - time.monotonic()
+        if delay > 0:
+            cv2.waitKey(max(1, round(delay * 1000)))
+        else:
+            next_time = time.monotonic()  # Fell behind, resynchronize
+        return next_time, consumer.get(timeout=0)
+
+    def _update_mosaic(self, consumer, cpu_start):
+        # Every camera is resized straight into its tile of one preallocated canvas, and the
+        # canvas is shown with a single imshow per cycle however many cameras there are
+        tile_width, tile_height = self.preview_size
+        columns = ceil(self.cam_num ** 0.5)
+        rows = ceil(self.cam_num / columns)
+        canvas = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+        tiles = []
+        for i in range(self.cam_num):
+            row, column = divmod(i, columns)
+            tiles.append(canvas[row * tile_height:(row + 1) * tile_height, column * tile_width:(column + 1) * tile_width])
+        next_time = time.monotonic()
+        while self.displaying:
+            next_time, frame = self._next_preview_frame(consumer, next_time)
+            updated = False
+            while frame is not None:  # Take everything queued since the last cycle, then show once
+                if frame.cam < len(tiles):
+                    start = time.monotonic()
+                    image = frame.demosaiced()
+                    if image.ndim == 2:  # Mono8
+                        cv2.cvtColor(cv2.resize(image, self.preview_size), cv2.COLOR_GRAY2BGR, dst=tiles[frame.cam])
+                    else:
+                        cv2.resize(image, self.preview_size, dst=tiles[frame.cam])
+                    cv2.putText(tiles[frame.cam], str(frame.cam), (8, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                    self.cam_stats[frame.cam].stage("resize").add(time.monotonic() - start)
+                    self.preview_shown += 1
+                    updated = True
+                frame = consumer.get(timeout=0)
+            start = time.monotonic()
+            if updated:
+                cv2.imshow(self.display_windows[0], canvas)
             cv2.waitKey(1)
+            if updated:
+                self.mosaic_show.add(time.monotonic() - start)
+            self.preview_cpu = time.thread_time() - cpu_start
 
-    def start_recording(self, w =2448, h =2048):
-        # Start recording video from the cameras
+    def start_recording(self, w=None, h=None):
+        # Start recording video from the cameras, at w x h if given (the cameras are reconfigured)
         if self.recording:
             print("Already recording!")  # Inform the user if already recording
             return
+        if w and h and any((settings["width"], settings["height"]) != (w, h) for settings in self.camera_settings):
+            self.set_resolution(w, h)
 
         try:
             self.writers = []  # Reset the writers list
+            self.frame_writers = []
+            self.filenames = []
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")  # Get the current timestamp for file naming
+            codec = self.recording_codec(self.codec)
+            mono_codec = self.recording_codec(self.mono_codec) if self.mono_codec else codec
+            os.makedirs(self.output_dir, exist_ok=True)
+            self.manifest = os.path.join(self.output_dir, f"recording_{timestamp}.manifest.jsonl")
             for i in range(self.cam_num):
-                filename = f"output/recording_cam{i}_{timestamp}.mp4"  # Create a filename for the recording
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Define the codec for the video writer
-                self.writers.append(cv2.VideoWriter(filename, fourcc, self.fps, (self.width, self.height)))  # Create a video writer for each camera
-                self.filenames.append(filename)
+                mono = self.is_mono(i)  # Checked per recording, the pixel format may have been changed
+                if mono:
+                    print(f"Camera {i}: Mono8, recording single-channel {self.mono_codec or self.codec}")
+                segments = {"cam": i, "codec": mono_codec if mono else codec, "manifest": self.manifest,
+                            "base_name": os.path.join(self.output_dir, f"recording_cam{i}_{timestamp}"),  # Create a filename for the recording
+                            "segment_seconds": self.segment_seconds, "segment_frames": self.segment_frames,
+                            "segment_mb": self.segment_mb, "is_color": not mono}
+                # One encoder worker per camera, each fed by its own bounded queue
+                depth, policy = self.record_queue_settings(i)
+                consumer = FrameConsumer(f"recorder cam{i}", [i], depth, policy)
+                size = (self.camera_settings[i]["width"], self.camera_settings[i]["height"])
+                fps = self.fps if self.trigger_source is not None else self.camera_settings[i]["fps"]  # Triggers set a common rate
+                if self.encoder_backend == "process":
+                    self.frame_writers.append(ProcessFrameWriter(i, consumer, segments, fps, size, self.shm_slots, self.frame_sizes[i],
+                                                                 self._encoder_failed))
+                else:
+                    self.writers.append(SegmentedWriter(fps=fps, size=size, **segments))  # Create a video writer for each camera
+                    self.frame_writers.append(FrameWriter(i, self.writers[-1], consumer, self._encoder_failed))
 
             
             self.recording = True  # Set the recording flag to true
             self.stop_event.clear()  # Clear the stop event
-            self.thread = threading.Thread(target=self._capture_frames)  # Create a thread to capture frames
-            self.thread.start()  # Start the frame capturing thread
+            self.record_id_counts = [stats.frame_ids.counts() for stats in self.cam_stats]
+            for stats in self.cam_stats:
+                stats.encoder_error = None
+            for frame_writer in self.frame_writers:
+                frame_writer.start()  # Start the encoder workers
+            if self.frame_sets is not None:
+                # No set is handed out during the switch, and every camera's pre-roll starts at
+                # the newest set all of them still hold, so the files start on the same set
+                with self.frame_sets.release_lock:
+                    firsts = [preroll.first_set() for preroll in self.prerolls.values()]
+                    first_set = float("inf") if None in firsts else max(firsts, default=None)
+                    self._attach_recording(first_set)
+            else:
+                self._attach_recording()
             print("Recording started...")  # Inform the user that recording has started
             
         except Exception as e:
             print(f"Failed to start recording: {str(e)}")  # Handle any exceptions that occur during recording initialization
             print(traceback.format_exc())
+            for preroll in self.prerolls.values():
+                preroll.stop_forwarding()
+            for frame_writer in self.frame_writers:
+                self.remove_consumer(frame_writer.consumer)
+                frame_writer.join()
+                frame_writer.release()
+            self.frame_writers = []
+            self.recording = False
             self.writers = []  # Reset the writers list
-            
-    def _capture_frames(self):
-        # Capture frames from the cameras while recording
-        while self.recording and not self.stop_event.is_set():
-            for i, window in enumerate(self.display_windows):
-                res = self.cam_system.wait_for_signal(self.receive_signals[i])  # Wait for a signal from the camera
-                if res == pytelicam.CamApiStatus.Success:
-                    with self.cam_devices[i].cam_stream.get_current_buffered_image() as image_data:
-                        if image_data.status == pytelicam.CamApiStatus.Success:
-                            if image_data.pixel_format == pytelicam.CameraPixelFormat.Mono8:
-                                frame = image_data.get_ndarray(pytelicam.OutputImageType.Raw)
-                                self.writers[i].write(frame)  # Write the frame to the corresponding video file
-                            else:
-                                frame = image_data.get_ndarray(pytelicam.OutputImageType.Bgr24)  # Get the current frame as a NumPy array
-                                self.writers[i].write(frame)  # Write the frame to the corresponding video file
+
+    def _attach_recording(self, first_set=None):
+        # Feed every encoder, its camera's pre-roll first when there is one
+        for frame_writer in self.frame_writers:
+            preroll = self.prerolls.get(frame_writer.cam)
+            if preroll is not None:
+                frames = preroll.start_forwarding(frame_writer.consumer, first_set)  # Buffered frames first, then live ones
+                span = frames[-1].received - frames[0].received if len(frames) > 1 else 0.0
+                print(f"Camera {frame_writer.cam}: {len(frames)} pre-roll frame(s), {span:.1f} s")
+            else:
+                self.attach_recording_consumer(frame_writer.consumer)
+
+    def _encoder_failed(self, frame_writer):
+        # Runs on the failed encoder's thread; the other cameras keep recording
+        self.remove_consumer(frame_writer.consumer)
+        self.cam_stats[frame_writer.cam].encoder_error = frame_writer.error
+
+    def recording_codec(self, name):
+        # Settings of a codec with codec_options applied
+        if name not in CODECS:
+            raise Exception(f"Unknown codec {name}. Use one of {tuple(CODECS)}")
+        codec = dict(CODECS[name])
+        for key, value in self.codec_options.items():
+            if codec["backend"] != "ffmpeg" and key in FFMPEG_OPTIONS:
+                print(f"Codec {name} ignores {key}, only ffmpeg codecs use it")
+                continue
+            codec[key] = value
+        return codec
+
+    def is_mono(self, i):
+        # Camera i delivers Mono8, which is copied out and recorded as one channel
+        res, pixel_format = self.cam_devices[i].cam_control.get_pixel_format()
+        return res == pytelicam.CamApiStatus.Success and pixel_format == pytelicam.CameraPixelFormat.Mono8
 
     def stop_display(self):
         # Stop displaying the camera feeds
-        if self.displaying:
+        if self.displaying and self.preview_server is not None:
+            self.displaying = False
+            self.preview_server.close()
+            self.preview_server = None
+            print("Camera preview server stopped")
+        elif self.displaying:
             self.displaying = False  # Set the displaying flag to false
             #self.stop_event.set()  # Signal to stop the display thread
             if self.display_thread.is_alive():
@@ -205,27 +2656,61 @@ class Recorder:
 
     def stop_recording(self, save=True):
         self.recording = False  # Set the recording flag to false
+        for frame_writer in self.frame_writers:
+            if frame_writer.cam in self.prerolls:
+                self.prerolls[frame_writer.cam].stop_forwarding()  # Back to buffering for the next recording
+            self.remove_consumer(frame_writer.consumer)  # Stop feeding the encoders and let them drain their queues
+        for frame_writer in self.frame_writers:
+            frame_writer.join()  # Wait for the encoder threads to finish
 
-        if self.thread.is_alive():
-            self.thread.join()  # Wait for the thread to finish
+        for frame_writer in self.frame_writers:
+            consumer = frame_writer.consumer
+            print(f"Camera {frame_writer.cam}: wrote {frame_writer.written} frame(s), dropped {consumer.dropped} "
+                  f"({consumer.policy}, depth {consumer.depth})")
+            print(f"  enqueue {consumer.enqueue_latency.summary()}")
+            print(f"  queued  {consumer.queue_latency.summary()}")
+            print(f"  encode  {frame_writer.encode_latency.summary()}")
+            print(f"  total   {frame_writer.end_to_end.summary()}")
+            if frame_writer.error is not None:
+                print(f"  encoder stopped early: {frame_writer.error}")
+            if frame_writer.cam < len(self.record_id_counts):
+                # Camera-side frame loss during this recording only
+                now = self.cam_stats[frame_writer.cam].frame_ids.counts()
+                start = self.record_id_counts[frame_writer.cam]
+                print(f"  frame IDs: {FrameIdTracker.describe(tuple(a - b for a, b in zip(now, start)))}")
+            frame_writer.release()
+        self.frame_writers = []
 
         self.stop_event.set()  # Signal to stop the thread
-        
-        for writer in self.writers:
-            writer.release()  # Release the video writer resources
-        
+
+        self.segments = read_manifest(self.manifest) if self.manifest else []
+        self.filenames = [segment["file"] for segment in self.segments]
+        self.filenames += sorted({segment["sidecar"] for segment in self.segments})
         if not save:
-            for file in self.filenames:
-                if os.path.exists(file):
+            for file in self.filenames + [self.manifest]:
+                if file and os.path.exists(file):
                     os.remove(file)  # Delete the temporary video file if not saving
-        
-        for file in self.filenames:
-            print("Recording stopped" + (f" and saved in {file}" if save else " (discarded)"))  # Inform the user of the recording status
-        
+
+        for cam in sorted({segment["cam"] for segment in self.segments}):
+            segments = [segment for segment in self.segments if segment["cam"] == cam]
+            files = [segment["file"] for segment in segments]
+            where = files[0] if len(files) == 1 else f"{len(files)} segments, {files[0]} ... {files[-1]}"
+            where += f", frame times in {os.path.basename(segments[0]['sidecar'])}"
+            print("Recording stopped" + (f" and saved in {where}" if save else " (discarded)"))  # Inform the user of the recording status
+        if save and self.manifest and os.path.exists(self.manifest):
+            print(f"Segment manifest: {self.manifest}")
+
         self.writers = []  # Reset the writers list
 
     def cleanup(self):
         self.stop_display()  # Stop displaying the camera feeds
+        self.stop_preroll()
+        self.stop_shared_preview()
+        self.stop_triggers()
+        self.stop_acquisition()  # Stop pulling frames before the streams are closed
+        if self.frame_sets is not None:
+            self.remove_consumer(self.frame_sets.consumer)
+            self.frame_sets.join()
         # Cleanup resources and terminate the camera system
         for i in range(self.cam_num):
             if self.cam_devices[i] is not None:
@@ -243,6 +2728,48 @@ class Recorder:
 
         print("Finished.")
 
+def use_simulated_cameras(**kwargs):
+    # Swap the SDK for the simulated cameras in simcam.py; kwargs go to simcam.configure()
+    global pytelicam
+    import simcam
+    simcam.configure(**kwargs)
+    pytelicam = simcam
+
+def benchmark_encoders(cams=2, frames=100, width=1224, height=1024, fps=25, slots=8, codec="mp4v"):
+    # Feed synthetic frames straight into each encoder backend, no cameras needed,
+    # and report aggregate encode throughput for this machine's core count
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+    settings = CODECS[codec]
+    size = (width, height)
+    print(f"Encoding {frames} frame(s) x {cams} camera(s) at {width}x{height} with {codec} on {os.cpu_count()} core(s)")
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in Recorder.ENCODERS:
+            frame_writers = []
+            for i in range(cams):
+                segments = {"cam": i, "codec": settings, "base_name": os.path.join(directory, f"bench_{backend}_cam{i}"),
+                            "manifest": os.path.join(directory, f"bench_{backend}.manifest.jsonl")}
+                consumer = FrameConsumer(f"bench cam{i}", [i], depth=frames, policy="block")
+                if backend == "process":
+                    frame_writers.append(ProcessFrameWriter(i, consumer, segments, fps, size, slots))
+                else:
+                    frame_writers.append(FrameWriter(i, SegmentedWriter(fps=fps, size=size, **segments), consumer))
+            for frame_writer in frame_writers:
+                frame_writer.start()  # Started before timing so process spawn cost is not counted
+            start = time.monotonic()
+            for n in range(frames):
+                for frame_writer in frame_writers:
+                    frame_writer.consumer.put(Frame(frame_writer.cam, images[n % len(images)], None, n, 0))
+            for frame_writer in frame_writers:
+                frame_writer.consumer.close()
+            for frame_writer in frame_writers:
+                frame_writer.join()
+            elapsed = time.monotonic() - start
+            written = sum(frame_writer.written for frame_writer in frame_writers)
+            for frame_writer in frame_writers:
+                frame_writer.release()
+            print(f"  {backend:8s}: {written / elapsed:7.1f} fps total | {written / elapsed / cams:6.1f} fps per camera | {elapsed:.2f} s")
+
 def handle_save(r):
     while True:
         save = input("Save recording? (yes/no): ").lower().strip()  # Ask the user if they want to save the recording
@@ -252,24 +2779,55 @@ def handle_save(r):
         else:
             print("Please enter 'yes' or 'no'.")  # Prompt for valid input
 
-"""
-#implement later
-def handle_start_recording(r):
-    w, h = 2448, 2048
-    while True:
-        default = input("Would you like the default width and height for the recording? (yes/no): ").lower().strip()
-        if default in ["yes", "no"]:
-            r.start_recording()
-            break
+def handle_set(r, args):
+    # set gain|exposure|fps VALUE [CAM], set size WIDTHxHEIGHT [CAM], set offset X,Y|center [CAM], set fov crop|full [CAM]
+    usage = "Usage: set gain|exposure|fps VALUE [CAM], set size WIDTHxHEIGHT [CAM], set offset X,Y|center [CAM], set fov crop|full [CAM]"
+    if len(args) not in (2, 3):
+        print(usage)
+        return
+    name, value = args[0], args[1]
+    try:
+        cams = [int(args[2])] if len(args) == 3 else None
+        if name in ("gain", "exposure", "fps"):
+            changes = {"exposure_time" if name == "exposure" else name: float(value)}
+            if name == "fps" and not changes["fps"] > 0:
+                print("The frame rate must be above 0")
+                return
+        elif name == "size":
+            width, height = parse_size(value)
+            changes = {"width": width, "height": height}
+        elif name == "offset":
+            x, y = (None, None) if value == "center" else (int(v) for v in value.split(","))
+            changes = {"offset_x": x, "offset_y": y}
+        elif name == "fov" and value in ("crop", "full"):
+            changes = {"field_of_view": value}
         else:
-            print("Please enter 'yes' or 'no'.")
-"""
+            print(usage)
+            return
+    except ValueError:
+        print(usage)
+        return
+    if cams is not None and not 0 <= cams[0] < r.cam_num:
+        print(f"No camera {cams[0]}, there are {r.cam_num}")
+        return
+    r.apply_settings(cams, **changes)
 
+def parse_size(text):
+    # "1224x1024" -> (1224, 1024)
+    width, height = (int(v) for v in text.lower().split("x"))
+    return width, height
 
 
 def del_input(cmd):
     if cmd == "start":
         recorder.start_recording()  # Start recording when the user enters "start"
+    elif cmd.startswith("start "):
+        try:
+            w, h = parse_size(cmd.split()[1])
+        except ValueError:
+            print("Usage: start WIDTHxHEIGHT")
+            return True
+        recorder.start_recording(w, h)  # Reconfigures the cameras if the size changed
     elif cmd == "stop":
         if recorder.recording:
             handle_save(recorder)
@@ -279,6 +2837,14 @@ def del_input(cmd):
         if recorder.recording:
             handle_save(recorder)
         return False
+    elif cmd == "stats":
+        recorder.print_stats()  # Show per-camera fps, stalls and consumer drops
+    elif cmd.startswith("set "):
+        handle_set(recorder, cmd.split()[1:])  # Change exposure, gain, fps or geometry while running
+    elif cmd == "config":
+        for i in range(recorder.cam_num):
+            recorder.verify_camera(i)
+        recorder.print_verification()  # Show what every camera is actually set to
     elif cmd == "debug_exit":
         return False
     else:
@@ -286,10 +2852,108 @@ def del_input(cmd):
 
     return True
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Toshiba Camera Pipeline App")
+    parser.add_argument("--acquisition", choices=Recorder.MODES, default="round_robin",
+                        help="read all cameras from one thread, give each camera its own thread, or use SDK callbacks")
+    parser.add_argument("--encoder", choices=Recorder.ENCODERS, default="thread",
+                        help="encode in worker threads, or in one process per camera via shared memory")
+    parser.add_argument("--buffers", type=int, default=0,
+                        help="stream ring buffer size per camera (1-128), 0 to size it from fps and --latency-budget")
+    parser.add_argument("--latency-budget", type=float, default=0.5,
+                        help="worst-case consumer latency in seconds the ring buffer should absorb")
+    parser.add_argument("--raw-bayer", action="store_true",
+                        help="acquire color cameras as raw Bayer and demosaic in the consumers instead of the SDK")
+    parser.add_argument("--chunk", action="store_true",
+                        help="read ChunkFrameID, exposure and gain from every frame for dropped-frame accounting")
+    parser.add_argument("--codec", choices=tuple(CODECS), default="mp4v",
+                        help="recording codec: mp4v, mjpg (cheap), ffv1 (lossless), or x264/x265/ffv1-ffmpeg through an ffmpeg pipe")
+    parser.add_argument("--mono-codec", choices=tuple(CODECS), default=None,
+                        help="codec for monochrome cameras, e.g. ffv1 for lossless gray (default: --codec)")
+    parser.add_argument("--preset", default=None, help="ffmpeg encoder preset, e.g. ultrafast, veryfast, medium")
+    parser.add_argument("--crf", type=int, default=None, help="ffmpeg constant rate factor, lower is better quality")
+    parser.add_argument("--encoder-threads", type=int, default=None, help="ffmpeg encoder threads per camera, 0 for auto")
+    parser.add_argument("--ffmpeg", default=None, help="path of the ffmpeg executable")
+    parser.add_argument("--segment-seconds", type=float, default=0, help="start a new file every N seconds (0 = never)")
+    parser.add_argument("--segment-frames", type=int, default=0, help="start a new file every N frames (0 = never)")
+    parser.add_argument("--segment-mb", type=float, default=0, help="start a new file every N megabytes (0 = never)")
+    parser.add_argument("--preroll", type=float, default=0, metavar="SECONDS",
+                        help="keep the last SECONDS of every camera in memory and start recordings with them")
+    parser.add_argument("--preroll-format", choices=PrerollBuffer.FORMATS, default="raw",
+                        help="store pre-roll frames as received or JPEG-compressed")
+    parser.add_argument("--preroll-mb", type=float, default=512, help="pre-roll memory cap per camera in MB")
+    parser.add_argument("--preroll-quality", type=int, default=90, help="JPEG quality of pre-roll frames")
+    parser.add_argument("--shm", nargs="?", const="tcpapp", default=None, metavar="PREFIX",
+                        help="publish every camera's newest frame to the shared-memory ring PREFIX_camN")
+    parser.add_argument("--shm-slots", type=int, default=4, help="frames kept in each shared-memory ring")
+    parser.add_argument("--size", type=parse_size, default=(1224, 1024), metavar="WIDTHxHEIGHT",
+                        help="recording resolution, reached with sensor ROI, binning or decimation before host resizing")
+    parser.add_argument("--field-of-view", choices=("crop", "full"), default="crop",
+                        help="crop: centred ROI at full resolution; full: keep the whole sensor view via binning/decimation")
+    parser.add_argument("--preview", choices=Recorder.PREVIEWS, default="windows",
+                        help="a preview window per camera, all cameras tiled into one window, or for headless "
+                             "hosts MJPEG streams over HTTP without any windows")
+    parser.add_argument("--preview-port", type=int, default=8080, help="local port of the --preview http server")
+    parser.add_argument("--preview-fps", type=float, default=10,
+                        help="preview refresh rate, sampling the newest frame of each camera; 0 shows every frame")
+    parser.add_argument("--trigger", choices=Recorder.TRIGGERS, default=None,
+                        help="synchronize all cameras on a shared hardware line or a host-clocked software trigger")
+    parser.add_argument("--config", default=None, metavar="FILE",
+                        help="camera settings as JSON or TOML: defaults for every camera and overrides by serial number")
+    parser.add_argument("--profile-dir", default="profiles",
+                        help="cache each camera's settings here (save_parameter) and restore them in one load next time")
+    parser.add_argument("--no-profiles", action="store_true", help="configure every camera from scratch, without the cache")
+    parser.add_argument("--refresh-profiles", action="store_true",
+                        help="configure from scratch and rebuild the cache, e.g. to redo the one-shot white balance")
+    parser.add_argument("--sim", type=int, default=0, metavar="N",
+                        help="run against N simulated cameras instead of the SDK")
+    parser.add_argument("--sim-size", default="2448x2048", help="simulated sensor size, WIDTHxHEIGHT")
+    parser.add_argument("--sim-format", default="BayerRG8",
+                        help="simulated pixel format (Mono8, BayerRG8, BGR8, ...), comma-separated to mix cameras")
+    parser.add_argument("--sim-fps", type=float, default=None, help="fixed simulated frame rate instead of the configured fps")
+    parser.add_argument("--sim-jitter", type=float, default=0.0, help="simulated frame interval jitter (std dev, seconds)")
+    parser.add_argument("--sim-drop", type=float, default=0.0, help="probability a simulated frame is dropped")
+    parser.add_argument("--sim-stall", type=float, default=0.0, help="probability per frame a simulated camera stalls")
+    parser.add_argument("--sim-open-time", type=float, default=0.0, help="seconds a simulated camera takes to open")
+    parser.add_argument("--sim-fail-open", default="", metavar="N,N",
+                        help="simulated camera indices that fail to open")
+    parser.add_argument("--bench-encoders", action="store_true",
+                        help="compare encoder backends on synthetic frames and exit")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.bench_encoders:
+        benchmark_encoders(codec=args.codec)
+        sys.exit()
+    if args.sim:
+        sensor_width, sensor_height = parse_size(args.sim_size)
+        use_simulated_cameras(cameras=args.sim, sensor_width=sensor_width, sensor_height=sensor_height,
+                              pixel_format=args.sim_format, fps=args.sim_fps, jitter=args.sim_jitter,
+                              drop_rate=args.sim_drop, stall_rate=args.sim_stall, open_time=args.sim_open_time,
+                              fail_open=[int(v) for v in args.sim_fail_open.split(",") if v.strip()])
+    elif pytelicam is None:
+        print("pytelicam is not installed. Install the TeliCamSDK wheel or run with --sim N.")
+        sys.exit()
     try:
-        recorder = Recorder()  # Create an instance of the Recorder class
-        print("Camera Control REPL...\nCommands: start, stop, exit")  # Display available commands
+        recorder = Recorder(acquisition_mode=args.acquisition, encoder_backend=args.encoder,
+                            buffer_count=args.buffers or None, latency_budget=args.latency_budget,
+                            raw_bayer=args.raw_bayer, chunk_data=args.chunk, trigger_source=args.trigger,
+                            width=args.size[0], height=args.size[1], field_of_view=args.field_of_view,
+                            preview=args.preview, preview_fps=args.preview_fps, preview_port=args.preview_port,
+                            profile_dir=None if args.no_profiles else args.profile_dir, refresh_profiles=args.refresh_profiles,
+                            camera_config=load_camera_config(args.config) if args.config else None)  # Create an instance of the Recorder class
+        recorder.codec = args.codec
+        recorder.mono_codec = args.mono_codec
+        recorder.segment_seconds, recorder.segment_frames, recorder.segment_mb = args.segment_seconds, args.segment_frames, args.segment_mb
+        if args.preroll > 0:
+            recorder.start_preroll(args.preroll, args.preroll_format, args.preroll_mb, args.preroll_quality)
+        if args.shm:
+            recorder.start_shared_preview(args.shm, args.shm_slots)
+        for key, value in (("preset", args.preset), ("crf", args.crf), ("threads", args.encoder_threads), ("command", args.ffmpeg)):
+            if value is not None:
+                recorder.codec_options[key] = value
+        print("Camera Control REPL...\nCommands: start, stop, stats, config, set, exit")  # Display available commands
         while True:
             cmd = input("> ").lower().strip()  # Get user input
             if del_input(cmd) == False: break
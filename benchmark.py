@@ -0,0 +1,312 @@
+"""
+Pipeline Benchmark
+------------------
+Runs the Recorder pipeline for a fixed number of recorded frames per camera and
+reports throughput, p50/p99/max latency per stage and per camera, CPU time and
+peak RSS. Every combination of camera count, resolution, pixel format and codec
+runs in its own process against the simulated cameras (or the real ones with
+--hardware), and the results are written to a JSON file.
+
+Stages (per camera):
+- "wait"      wait_for_signal, including idle time between frames
+- "copy"      get_ndarray and the copy out of the SDK buffer
+- "publish"   handing the frame to every consumer
+- "enqueue"   time the recording queue held up acquisition
+- "queue"     time a frame waited for its encoder
+- "encode"    VideoWriter.write
+- "total"     host receive to encoded
+- "resize"/"show"  preview cv2.resize and imshow, with --preview
+
+With --preview the result also has the preview thread's CPU time, the frames it
+showed and skipped at --preview-fps, and the CPU the skipped frames would have cost.
+
+Usage:
+- python benchmark.py --out results.json
+- python benchmark.py --cams 1,4 --sizes 1224x1024,612x512 --formats BayerRG8 --codecs mp4v,mjpg
+- python benchmark.py --compare old.json new.json
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import traceback
+from datetime import datetime
+import numpy as np
+import cv2
+import TCPApp
+
+
+def peak_rss():
+    # Peak resident set size in bytes of this process and of its finished child processes
+    try:
+        import resource
+    except ImportError:  # Windows
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        counters = Counters()
+        counters.cb = ctypes.sizeof(Counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None, None
+        return counters.PeakWorkingSetSize, None  # Encoder processes are not tracked on Windows
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is in bytes on macOS, KiB elsewhere
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+def cpu_times():
+    # (this process, waited-for child processes) CPU seconds; children read 0 on Windows
+    times = os.times()
+    return times.user + times.system, times.children_user + times.children_system
+
+
+def config_name(config):
+    preview = f"_{config['preview']}{config.get('preview_fps', 0):g}fps" if config["preview"] else ""
+    return (f"{config['cams']}cam_{config['size']}_{config['format']}{'_raw' if config['raw_bayer'] else ''}_"
+            f"{config['codec']}_{config['encoder']}_{config['acquisition']}{preview}")
+
+
+def run_config(config):
+    # One benchmark run, meant to be the only thing running in this process
+    width, height = (int(v) for v in config["size"].lower().split("x"))
+    if not config["hardware"]:
+        # A sensor twice the recording size, like the 2448x2048 sensors around the default 1224x1024 ROI
+        TCPApp.use_simulated_cameras(cameras=config["cams"], sensor_width=2 * width, sensor_height=2 * height,
+                                     pixel_format=config["format"], seed=0)
+    cpu_start, children_start = cpu_times()
+    recorder = TCPApp.Recorder(acquisition_mode=config["acquisition"], encoder_backend=config["encoder"],
+                               raw_bayer=config["raw_bayer"], width=width, height=height, fps=config["fps"],
+                               preview=config["preview"], preview_fps=config.get("preview_fps", 0),
+                               profile_dir=None)  # Configure from scratch like the runs before the profile cache
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            recorder.output_dir = directory
+            recorder.codec = config["codec"]
+            recorder.codec_options = config["codec_options"]
+            deadline = time.monotonic() + config["timeout"]
+            while min(stats.frames for stats in recorder.cam_stats) < config["warmup"]:
+                if time.monotonic() > deadline:
+                    raise Exception("Cameras did not deliver the warmup frames in time")
+                time.sleep(0.01)
+            for stats in recorder.cam_stats:
+                stats.stages.clear()  # Only measure the recording
+            preview_start = recorder.preview_report() if recorder.preview_consumer else None
+            id_counts = [stats.frame_ids.counts() for stats in recorder.cam_stats]
+
+            start = time.monotonic()
+            recorder.start_recording()
+            frame_writers = list(recorder.frame_writers)
+            if not frame_writers:
+                raise Exception("Recording did not start")
+            while min(frame_writer.written for frame_writer in frame_writers) < config["frames"]:
+                if time.monotonic() > deadline:
+                    raise Exception("Recording did not reach the frame count in time")
+                time.sleep(0.005)
+            recorder.stop_recording(save=True)  # Returns once every frame is encoded and the files are closed
+            elapsed = time.monotonic() - start
+
+            cameras = []
+            for frame_writer in frame_writers:
+                i = frame_writer.cam
+                stats = recorder.cam_stats[i]
+                stages = {name: stage.report() for name, stage in stats.stages.items()}
+                stages["enqueue"] = frame_writer.consumer.enqueue_latency.report()
+                stages["queue"] = frame_writer.consumer.queue_latency.report()
+                stages["encode"] = frame_writer.encode_latency.report()
+                stages["total"] = frame_writer.end_to_end.report()
+                gaps, missing, duplicates, reorders = (a - b for a, b in zip(stats.frame_ids.counts(), id_counts[i]))
+                cameras.append({"cam": i, "frames": frame_writer.written, "fps": frame_writer.written / elapsed,
+                                "dropped": frame_writer.consumer.dropped,
+                                "bytes": sum(segment["bytes"] for segment in recorder.segments if segment["cam"] == i),
+                                "missing_ids": missing, "duplicate_ids": duplicates, "stages": stages})
+            preview = None
+            if preview_start is not None:
+                preview_end = recorder.preview_report()
+                preview = {key: preview_end[key] - preview_start[key] for key in ("shown", "skipped", "cpu_s")}
+                per_frame = preview["cpu_s"] / preview["shown"] if preview["shown"] else 0.0
+                preview.update(fps=preview_end["fps"], saved_cpu_s=preview["skipped"] * per_frame)
+    finally:
+        recorder.cleanup()
+
+    cpu_end, children_end = cpu_times()
+    rss, children_rss = peak_rss()
+    frames = sum(camera["frames"] for camera in cameras)
+    return {"elapsed_s": elapsed, "frames": frames, "fps": frames / elapsed,
+            "cpu_s": cpu_end - cpu_start, "children_cpu_s": children_end - children_start,
+            "cpu_per_frame_ms": (cpu_end - cpu_start + children_end - children_start) / frames * 1000 if frames else None,
+            "peak_rss_bytes": rss, "children_peak_rss_bytes": children_rss, "cameras": cameras, "preview": preview}
+
+
+def run_isolated(config, timeout):
+    # Run one configuration in a fresh interpreter so CPU time and peak RSS are its own
+    with tempfile.TemporaryDirectory() as directory:
+        result_file = os.path.join(directory, "result.json")
+        command = [sys.executable, os.path.abspath(__file__), "--run", json.dumps(config), "--result", result_file]
+        try:
+            process = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                                     cwd=os.path.dirname(os.path.abspath(__file__)))
+        except subprocess.TimeoutExpired:
+            return {"error": f"timed out after {timeout} s"}
+        if not os.path.exists(result_file):
+            output = (process.stdout + process.stderr).strip().splitlines()
+            return {"error": f"exit code {process.returncode}", "output": output[-20:]}
+        with open(result_file) as f:
+            return json.load(f)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_result(name, result):
+    if "error" in result:
+        print(f"{name}: FAILED ({result['error']})")
+        for line in result.get("output", []):
+            print(f"    {line}")
+        return
+    print(f"{name}: {result['fps']:.1f} fps | cpu {result['cpu_s'] + result['children_cpu_s']:.2f} s "
+          f"({result['cpu_per_frame_ms']:.2f} ms/frame) | peak rss {(result['peak_rss_bytes'] or 0) / 1e6:.0f} MB")
+    preview = result.get("preview")
+    if preview:
+        print(f"  preview at {preview['fps']:g} fps: shown {preview['shown']} | skipped {preview['skipped']} | "
+              f"cpu {preview['cpu_s']:.2f} s | saved ~{preview['saved_cpu_s']:.2f} s")
+    for camera in result["cameras"]:
+        print(f"  camera {camera['cam']}: {camera['frames']} frame(s) {camera['fps']:.1f} fps | dropped {camera['dropped']} | "
+              f"missing IDs {camera['missing_ids']} | {camera['bytes'] / 1e6:.1f} MB")
+        for stage, report in camera["stages"].items():
+            print(f"    {stage:8s} p50 {report['p50_ms']:7.2f} ms | p99 {report['p99_ms']:7.2f} ms | max {report['max_ms']:7.2f} ms")
+
+
+def compare(old_file, new_file, threshold):
+    # Print per-configuration changes; returns the number of regressions beyond threshold (percent)
+    with open(old_file) as f:
+        old = {config_name(run["config"]): run for run in json.load(f)["runs"]}
+    with open(new_file) as f:
+        new = {config_name(run["config"]): run for run in json.load(f)["runs"]}
+    regressions = 0
+    for name in sorted(set(old) & set(new)):
+        before, after = old[name]["result"], new[name]["result"]
+        if "error" in before or "error" in after:
+            print(f"{name}: skipped (failed in {'old' if 'error' in before else 'new'} run)")
+            continue
+        changes = [("fps", before["fps"], after["fps"], True),
+                   ("cpu/frame", before["cpu_per_frame_ms"], after["cpu_per_frame_ms"], False),
+                   ("peak rss MB", (before["peak_rss_bytes"] or 0) / 1e6, (after["peak_rss_bytes"] or 0) / 1e6, False)]
+        if before.get("preview") and after.get("preview"):
+            changes.append(("preview cpu s", before["preview"]["cpu_s"], after["preview"]["cpu_s"], False))
+        for cam_before, cam_after in zip(before["cameras"], after["cameras"]):
+            for stage in cam_before["stages"]:
+                if stage in cam_after["stages"]:
+                    changes.append((f"cam{cam_before['cam']} {stage} p99", cam_before["stages"][stage]["p99_ms"],
+                                    cam_after["stages"][stage]["p99_ms"], False))
+        print(name)
+        for label, a, b, higher_is_better in changes:
+            if not a or b is None:
+                continue
+            percent = (b - a) / a * 100
+            worse = -percent if higher_is_better else percent
+            flag = ""
+            if worse > threshold and label.split()[-2:] != ["wait", "p99"]:  # Waiting on the camera is not a cost
+                flag = "  <-- regression"
+                regressions += 1
+            print(f"  {label:22s} {a:10.2f} -> {b:10.2f} ({percent:+6.1f}%){flag}")
+    for name in sorted(set(old) ^ set(new)):
+        print(f"{name}: only in {'old' if name in old else 'new'} run")
+    return regressions
+
+
+def parse_codecs(text):
+    # "mp4v,mjpg" -> ["mp4v", "mjpg"], checked against TCPApp.CODECS so a typo fails before any run
+    codecs = text.split(",")
+    unknown = [codec for codec in codecs if codec not in TCPApp.CODECS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown codec(s) {', '.join(unknown)}, use {', '.join(TCPApp.CODECS)}")
+    return codecs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the Recorder pipeline")
+    parser.add_argument("--cams", default="1,2", help="comma-separated camera counts")
+    parser.add_argument("--sizes", default="1224x1024", help="comma-separated recording sizes, WIDTHxHEIGHT")
+    parser.add_argument("--formats", default="Mono8,BayerRG8,BGR8", help="comma-separated simulated pixel formats")
+    parser.add_argument("--codecs", type=parse_codecs, default="mp4v,mjpg,ffv1", help=f"comma-separated codecs from {', '.join(TCPApp.CODECS)}")
+    parser.add_argument("--preset", default=None, help="ffmpeg encoder preset")
+    parser.add_argument("--crf", type=int, default=None, help="ffmpeg constant rate factor")
+    parser.add_argument("--encoder-threads", type=int, default=None, help="ffmpeg encoder threads per camera")
+    parser.add_argument("--frames", type=int, default=250, help="frames to record per camera")
+    parser.add_argument("--warmup", type=int, default=25, help="frames per camera to let pass before recording")
+    parser.add_argument("--fps", type=float, default=25, help="camera frame rate")
+    parser.add_argument("--acquisition", choices=TCPApp.Recorder.MODES, default="round_robin")
+    parser.add_argument("--encoder", choices=TCPApp.Recorder.ENCODERS, default="thread")
+    parser.add_argument("--raw-bayer", action="store_true")
+    parser.add_argument("--preview", nargs="?", const="windows", default=False, choices=TCPApp.Recorder.PREVIEWS,
+                        help="include the preview windows, or one mosaic window (needs a display)")
+    parser.add_argument("--preview-fps", type=float, default=10, help="preview refresh rate, 0 shows every frame")
+    parser.add_argument("--hardware", action="store_true",
+                        help="use the connected cameras; --cams and --formats are ignored")
+    parser.add_argument("--timeout", type=float, default=0, help="seconds per configuration, 0 to derive from --frames")
+    parser.add_argument("--out", default=None, help="JSON results file (default bench_<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files and exit")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change --compare reports as a regression")
+    parser.add_argument("--run", help=argparse.SUPPRESS)  # Internal: one configuration as JSON
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) else 0)
+
+    if args.run:
+        try:
+            result = run_config(json.loads(args.run))
+        except Exception as e:
+            result = {"error": str(e), "output": traceback.format_exc().splitlines()}
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        os._exit(0)  # Don't wait on threads a failed run may have left behind
+
+    timeout = args.timeout or 60 + 3 * (args.frames + args.warmup) / args.fps
+    codec_options = {key: value for key, value in (("preset", args.preset), ("crf", args.crf), ("threads", args.encoder_threads))
+                     if value is not None}
+    configs = []
+    for cams in ([0] if args.hardware else [int(v) for v in args.cams.split(",")]):
+        for size in args.sizes.split(","):
+            for pixel_format in (["camera"] if args.hardware else args.formats.split(",")):
+                for codec in args.codecs:
+                    configs.append({"cams": cams, "size": size, "format": pixel_format, "codec": codec, "codec_options": codec_options,
+                                    "frames": args.frames, "warmup": args.warmup, "fps": args.fps,
+                                    "acquisition": args.acquisition, "encoder": args.encoder,
+                                    "raw_bayer": args.raw_bayer, "preview": args.preview, "preview_fps": args.preview_fps,
+                                    "hardware": args.hardware, "timeout": timeout})
+
+    runs = []
+    for n, config in enumerate(configs):
+        print(f"[{n + 1}/{len(configs)}] {config_name(config)}")
+        result = run_isolated(config, timeout + 30)
+        print_result(config_name(config), result)
+        runs.append({"config": config, "result": result})
+
+    report = {"created": datetime.now().isoformat(timespec="seconds"), "revision": git_revision(),
+              "platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count(),
+              "numpy": np.__version__, "opencv": cv2.__version__, "runs": runs}
+    out = args.out or f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
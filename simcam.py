@@ -0,0 +1,883 @@
+"""
+Simulated Cameras
+-----------------
+A drop-in stand-in for the subset of the pytelicam SDK that TCPApp uses, so the
+acquisition, preview and recording pipeline can be run, profiled and tested on
+any machine without Toshiba USB3 cameras attached.
+
+Each simulated camera generates frames on its own thread at the configured size,
+pixel format and frame rate, stores them in a stream ring buffer with the same
+semantics as the SDK (signals, buffer indices, locking, callbacks, BufferBusy),
+and can inject timing jitter, dropped frames, stalls, image errors, slow opens and
+cameras that fail to open.
+
+Usage:
+    import simcam
+    simcam.configure(cameras=4, pixel_format="BayerRG8", jitter=0.002, drop_rate=0.01)
+    cam_system = simcam.get_camera_system(int(simcam.CameraType.U3v))
+"""
+import sys
+import enum
+import json
+import random
+import threading
+import time
+import numpy as np
+import cv2
+
+pytelicam = sys.modules[__name__]  # The SDK exposes its enums under pytelicam.pytelicam as well
+
+
+class CamApiStatus(enum.IntEnum):
+    Success = 0
+    NotFound = 3
+    AlreadyOpened = 4
+    InvalidCameraIndex = 6
+    InvalidParameter = 12
+    NotImplemented = 16
+    Timeout = 17
+    NotReady = 19
+    IoDeviceError = 26
+    AccessDenied = 32
+    Busy = 33
+
+
+class CameraType(enum.IntFlag):
+    U3v = 1
+    Gev = 2
+    GenTL = 4
+    All = 3
+
+
+class CameraPixelFormat(enum.IntEnum):
+    Unknown = 0
+    Mono8 = 1
+    BayerGR8 = 7
+    BayerRG8 = 10
+    BayerGB8 = 13
+    BayerBG8 = 16
+    BGR8 = 20
+
+
+class OutputImageType(enum.IntEnum):
+    Raw = 0
+    Bgr24 = 1
+    Bgra32 = 2
+
+
+class CameraAcqFrameRateCtrl(enum.IntEnum):
+    NoSpecify = 0
+    Manual = 1
+
+
+class CameraBalanceWhiteAuto(enum.IntEnum):
+    Off = 0
+    Once = 1
+    Continuous = 2
+
+
+class CameraTriggerSource(enum.IntEnum):
+    Line0 = 0
+    Line1 = 1
+    Line2 = 2
+    Software = 3
+
+
+class CameraTriggerSequence(enum.IntEnum):
+    Sequence0 = 0
+
+
+class CameraChunkSelector(enum.IntEnum):
+    BlockID = 0
+    ExposureTime = 5
+    Gain = 6
+
+
+class PytelicamError(Exception):
+    def __init__(self, message, status=CamApiStatus.InvalidParameter):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class SimConfig:
+    # Everything a simulated rig can be told to do
+    def __init__(self, cameras=2, sensor_width=2448, sensor_height=2048, pixel_format="BayerRG8", fps=None,
+                 jitter=0.0, drop_rate=0.0, stall_rate=0.0, stall_time=0.5, error_rate=0.0, line_rate=25.0, seed=None,
+                 open_time=0.0, fail_open=()):
+        self.cameras = cameras  # Number of cameras reported by get_num_of_cameras()
+        self.sensor_width = sensor_width
+        self.sensor_height = sensor_height
+        self.pixel_format = pixel_format  # Pixel format name, or comma-separated names cycled over the cameras
+        self.fps = fps  # Fixed camera clock, or None to follow AcquisitionFrameRate
+        self.jitter = jitter  # Standard deviation of the frame interval, in seconds
+        self.drop_rate = drop_rate  # Probability a frame is lost on the camera side (its frame ID is skipped)
+        self.stall_rate = stall_rate  # Probability per frame that the camera stops sending for stall_time
+        self.stall_time = stall_time  # Seconds a stall lasts
+        self.error_rate = error_rate  # Probability a frame arrives with an error status
+        self.line_rate = line_rate  # Pulses per second on the shared hardware trigger lines
+        self.seed = seed
+        self.open_time = open_time  # Seconds CameraDevice.open() takes, like USB enumeration and GenICam setup
+        self.fail_open = set(fail_open)  # Camera indices whose open() fails
+
+    def pixel_format_for(self, index):
+        names = [name.strip() for name in self.pixel_format.split(",")]
+        return CameraPixelFormat[names[index % len(names)]]
+
+
+config = SimConfig()
+
+
+def configure(**kwargs):
+    # Replace the configuration used by cameras created after this call
+    global config
+    config = SimConfig(**kwargs)
+    return config
+
+
+def get_camera_system(camera_type=int(CameraType.U3v)):
+    return CameraSystem(config)
+
+
+class Signal:
+    # Auto-reset event, like the SDK's signal handle
+    def __init__(self):
+        self.event = threading.Event()
+
+
+class SystemInformation:
+    def __init__(self):
+        self.dll_version = "simcam"
+
+
+class CameraInformation:
+    def __init__(self, index, pixel_format):
+        self.cam_type = CameraType.U3v
+        self.cam_vendor = "Simulated"
+        self.cam_model = f"SIM-{pixel_format.name}"
+        self.cam_serial_number = f"SIM{index:05d}"
+        self.cam_version = "1.0"
+        self.cam_user_defined_name = ""
+        self.cam_display_name = f"Simulated camera {index}"
+        self.tl_vendor = "Simulated"
+        self.tl_model = "simcam"
+        self.tl_version = "1.0"
+        self.tl_display_name = "simcam"
+        self.tl_if_display_name = "simcam"
+
+
+class TriggerLine:
+    # Shared hardware trigger line: one pulse wakes every camera listening to it
+    def __init__(self, rate):
+        self.period = 1.0 / rate
+        self.cond = threading.Condition()
+        self.pulses = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        next_time = time.monotonic()
+        while self.running:
+            next_time += self.period
+            time.sleep(max(0.0, next_time - time.monotonic()))
+            with self.cond:
+                self.pulses += 1
+                self.cond.notify_all()
+
+    def wait(self, last_pulse, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: self.pulses != last_pulse or not self.running, timeout)
+            return self.pulses
+
+    def stop(self):
+        self.running = False
+
+
+class CameraSystem:
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lines = {}  # Trigger source -> TriggerLine, started on first use
+        self.lines_lock = threading.Lock()
+
+    def get_information(self):
+        return SystemInformation()
+
+    def get_num_of_cameras(self):
+        return self.config.cameras
+
+    def get_camera_information(self, index):
+        if not 0 <= index < self.config.cameras:
+            raise PytelicamError(f"Invalid camera index {index}", CamApiStatus.InvalidCameraIndex)
+        return CameraInformation(index, self.config.pixel_format_for(index))
+
+    def create_device_object(self, index):
+        if not 0 <= index < self.config.cameras:
+            raise PytelicamError(f"Invalid camera index {index}", CamApiStatus.InvalidCameraIndex)
+        return CameraDevice(self, index)
+
+    def create_signal(self):
+        return Signal()
+
+    def close_signal(self, signal):
+        signal.event.set()
+
+    def wait_for_signal(self, signal, milliseconds=5000):
+        timeout = None if milliseconds < 0 else milliseconds / 1000.0
+        if not signal.event.wait(timeout):
+            return CamApiStatus.Timeout
+        signal.event.clear()
+        return CamApiStatus.Success
+
+    def reset_signal(self, signal):
+        signal.event.clear()
+        return CamApiStatus.Success
+
+    def trigger_line(self, source):
+        with self.lines_lock:
+            if source not in self.lines:
+                self.lines[source] = TriggerLine(self.config.line_rate)
+            return self.lines[source]
+
+    def terminate(self):
+        for line in self.lines.values():
+            line.stop()
+
+
+class CameraDevice:
+    def __init__(self, system, index):
+        self.system = system
+        self.index = index
+        self.is_open = False
+        self.is_support_iidc2 = True
+        self.pixel_format = system.config.pixel_format_for(index)
+        self.cam_control = CameraControl(self)
+        self.cam_stream = CameraStream(self)
+        self.genapi = GenApiWrapper(self)
+
+    def open(self):
+        if self.is_open:
+            raise PytelicamError("Camera already opened", CamApiStatus.AlreadyOpened)
+        time.sleep(self.system.config.open_time)
+        if self.index in self.system.config.fail_open:
+            raise PytelicamError("Camera did not respond", CamApiStatus.Timeout)
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def save_parameter(self, file_full_path):
+        # A text file of the feature values, like the SDK's GenApi parameter file
+        control = self.cam_control
+        if self.cam_stream.is_grabbing:
+            raise PytelicamError("Can't save parameters while streaming", CamApiStatus.AccessDenied)
+        values = {name: getattr(control, name) for name in CameraControl.PARAMETERS}
+        values["chunk_enable"] = sorted(int(selector) for selector in control.chunk_enable)
+        with open(file_full_path, "w") as f:
+            json.dump({"model": f"SIM-{self.pixel_format.name}", "parameters": values}, f, indent=1)
+
+    def load_parameter(self, file_full_path):
+        control = self.cam_control
+        if self.cam_stream.is_grabbing:
+            raise PytelicamError("Can't load parameters while streaming", CamApiStatus.AccessDenied)
+        try:
+            with open(file_full_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            raise PytelicamError(f"Can't load parameter file: {e}", CamApiStatus.InvalidParameter)
+        if saved.get("model") != f"SIM-{self.pixel_format.name}":
+            raise PytelicamError("Parameter file is for another camera model", CamApiStatus.InvalidParameter)
+        values = saved["parameters"]
+        for name in CameraControl.PARAMETERS:
+            kind = type(getattr(control, name))
+            setattr(control, name, kind(values[name]))  # Enum features come back as enums
+        control.chunk_enable = {CameraChunkSelector(selector) for selector in values["chunk_enable"]}
+
+
+class CameraControl:
+    # Feature values of one simulated camera. Like the SDK, normal failures are returned as a status.
+    PARAMETERS = ("width", "height", "offset_x", "offset_y", "binning", "decimation", "frame_rate", "frame_rate_control",
+                  "gain", "exposure_time", "balance_white_auto", "trigger_mode", "trigger_source", "trigger_sequence",
+                  "chunk_mode_active")  # Saved by save_parameter
+    def __init__(self, device):
+        config = device.system.config
+        self.device = device
+        self.sensor_width = config.sensor_width
+        self.sensor_height = config.sensor_height
+        self.width = config.sensor_width
+        self.height = config.sensor_height
+        self.offset_x = 0
+        self.offset_y = 0
+        self.binning = [1, 1]  # Horizontal, vertical
+        self.decimation = [1, 1]
+        self.frame_rate = config.fps or 25.0
+        self.frame_rate_control = CameraAcqFrameRateCtrl.NoSpecify
+        self.gain = 0.0
+        self.exposure_time = 10000.0  # Microseconds
+        self.balance_white_auto = CameraBalanceWhiteAuto.Off
+        self.trigger_mode = False
+        self.trigger_source = CameraTriggerSource.Software
+        self.trigger_sequence = CameraTriggerSequence.Sequence0
+        self.chunk_mode_active = False
+        self.chunk_enable = set()
+
+    def _writable(self):
+        # Geometry cannot change while the stream is running
+        return not self.device.cam_stream.is_grabbing
+
+    def get_sensor_width(self):
+        return CamApiStatus.Success, self.sensor_width
+
+    def get_sensor_height(self):
+        return CamApiStatus.Success, self.sensor_height
+
+    def _area(self):
+        # Readable area after binning and decimation, which the ROI is cut from
+        return (self.sensor_width // (self.binning[0] * self.decimation[0]),
+                self.sensor_height // (self.binning[1] * self.decimation[1]))
+
+    def _set_factor(self, factors, axis, value):
+        if not self._writable():
+            return CamApiStatus.AccessDenied
+        if value not in (1, 2, 4):
+            return CamApiStatus.InvalidParameter
+        factors[axis] = int(value)
+        # Like the cameras, shrink the ROI to fit the new readable area
+        area_width, area_height = self._area()
+        self.offset_x, self.offset_y = min(self.offset_x, area_width - 8), min(self.offset_y, area_height - 2)
+        self.offset_x -= self.offset_x % 4
+        self.offset_y -= self.offset_y % 2
+        self.width = min(self.width, area_width - self.offset_x) // 4 * 4
+        self.height = min(self.height, area_height - self.offset_y) // 2 * 2
+        return CamApiStatus.Success
+
+    def _binning_supported(self):
+        return self.device.pixel_format == CameraPixelFormat.Mono8  # Color sensors would mix the Bayer pattern
+
+    def get_binning_horizontal_min_max(self):
+        if not self._binning_supported():
+            return CamApiStatus.NotImplemented, 1, 1
+        return CamApiStatus.Success, 1, 4
+
+    def get_binning_horizontal(self):
+        return CamApiStatus.Success, self.binning[0]
+
+    def set_binning_horizontal(self, value):
+        if not self._binning_supported():
+            return CamApiStatus.NotImplemented
+        return self._set_factor(self.binning, 0, value)
+
+    def get_binning_vertical_min_max(self):
+        return self.get_binning_horizontal_min_max()
+
+    def get_binning_vertical(self):
+        return CamApiStatus.Success, self.binning[1]
+
+    def set_binning_vertical(self, value):
+        if not self._binning_supported():
+            return CamApiStatus.NotImplemented
+        return self._set_factor(self.binning, 1, value)
+
+    def get_decimation_horizontal_min_max(self):
+        return CamApiStatus.Success, 1, 4
+
+    def get_decimation_horizontal(self):
+        return CamApiStatus.Success, self.decimation[0]
+
+    def set_decimation_horizontal(self, value):
+        return self._set_factor(self.decimation, 0, value)
+
+    def get_decimation_vertical_min_max(self):
+        return CamApiStatus.Success, 1, 4
+
+    def get_decimation_vertical(self):
+        return CamApiStatus.Success, self.decimation[1]
+
+    def set_decimation_vertical(self, value):
+        return self._set_factor(self.decimation, 1, value)
+
+    def get_width_min_max(self):
+        return CamApiStatus.Success, 8, self._area()[0] - self.offset_x, 4
+
+    def get_width(self):
+        return CamApiStatus.Success, self.width
+
+    def set_width(self, width):
+        if not self._writable():
+            return CamApiStatus.AccessDenied
+        if width % 4 or not 8 <= width <= self._area()[0] - self.offset_x:
+            return CamApiStatus.InvalidParameter
+        self.width = int(width)
+        return CamApiStatus.Success
+
+    def get_height_min_max(self):
+        return CamApiStatus.Success, 2, self._area()[1] - self.offset_y, 2
+
+    def get_height(self):
+        return CamApiStatus.Success, self.height
+
+    def set_height(self, height):
+        if not self._writable():
+            return CamApiStatus.AccessDenied
+        if height % 2 or not 2 <= height <= self._area()[1] - self.offset_y:
+            return CamApiStatus.InvalidParameter
+        self.height = int(height)
+        return CamApiStatus.Success
+
+    def get_offset_x_min_max(self):
+        return CamApiStatus.Success, 0, self._area()[0] - self.width, 4
+
+    def get_offset_x(self):
+        return CamApiStatus.Success, self.offset_x
+
+    def set_offset_x(self, offset_x):
+        if not self._writable():
+            return CamApiStatus.AccessDenied
+        if offset_x % 4 or not 0 <= offset_x <= self._area()[0] - self.width:
+            return CamApiStatus.InvalidParameter
+        self.offset_x = int(offset_x)
+        return CamApiStatus.Success
+
+    def get_offset_y_min_max(self):
+        return CamApiStatus.Success, 0, self._area()[1] - self.height, 2
+
+    def get_offset_y(self):
+        return CamApiStatus.Success, self.offset_y
+
+    def set_offset_y(self, offset_y):
+        if not self._writable():
+            return CamApiStatus.AccessDenied
+        if offset_y % 2 or not 0 <= offset_y <= self._area()[1] - self.height:
+            return CamApiStatus.InvalidParameter
+        self.offset_y = int(offset_y)
+        return CamApiStatus.Success
+
+    def get_pixel_format(self):
+        return CamApiStatus.Success, self.device.pixel_format
+
+    def get_stream_payload_size(self):
+        channels = 3 if self.device.pixel_format == CameraPixelFormat.BGR8 else 1
+        return CamApiStatus.Success, self.width * self.height * channels
+
+    def get_acquisition_frame_rate_control(self):
+        return CamApiStatus.Success, self.frame_rate_control
+
+    def set_acquisition_frame_rate_control(self, value):
+        self.frame_rate_control = value
+        return CamApiStatus.Success
+
+    def get_acquisition_frame_rate_min_max(self):
+        return CamApiStatus.Success, 1.0, 120.0
+
+    def get_acquisition_frame_rate(self):
+        return CamApiStatus.Success, self.frame_rate
+
+    def set_acquisition_frame_rate(self, frame_rate):
+        if not 1.0 <= frame_rate <= 120.0:
+            return CamApiStatus.InvalidParameter
+        self.frame_rate = float(frame_rate)
+        return CamApiStatus.Success
+
+    def get_gain_min_max(self):
+        return CamApiStatus.Success, 0.0, 24.0
+
+    def get_gain(self):
+        return CamApiStatus.Success, self.gain
+
+    def set_gain(self, gain):
+        if not 0.0 <= gain <= 24.0:
+            return CamApiStatus.InvalidParameter
+        self.gain = float(gain)
+        return CamApiStatus.Success
+
+    def get_exposure_time_min_max(self):
+        return CamApiStatus.Success, 10.0, 1000000.0
+
+    def get_exposure_time(self):
+        return CamApiStatus.Success, self.exposure_time
+
+    def set_exposure_time(self, microseconds):
+        if not 10.0 <= microseconds <= 1000000.0:
+            return CamApiStatus.InvalidParameter
+        self.exposure_time = float(microseconds)
+        return CamApiStatus.Success
+
+    def get_balance_white_auto(self):
+        return CamApiStatus.Success, self.balance_white_auto
+
+    def set_balance_white_auto(self, value):
+        if self.device.pixel_format == CameraPixelFormat.Mono8:
+            return CamApiStatus.NotImplemented
+        if value == CameraBalanceWhiteAuto.Once:
+            time.sleep(0.2)  # One-shot white balance takes a while on real cameras
+            value = CameraBalanceWhiteAuto.Off
+        self.balance_white_auto = value
+        return CamApiStatus.Success
+
+    def get_trigger_mode(self):
+        return CamApiStatus.Success, self.trigger_mode
+
+    def set_trigger_mode(self, value):
+        self.trigger_mode = bool(value)
+        return CamApiStatus.Success
+
+    def get_trigger_source(self):
+        return CamApiStatus.Success, self.trigger_source
+
+    def set_trigger_source(self, source):
+        self.trigger_source = CameraTriggerSource(source)
+        return CamApiStatus.Success
+
+    def get_trigger_sequence(self):
+        return CamApiStatus.Success, self.trigger_sequence
+
+    def set_trigger_sequence(self, sequence):
+        self.trigger_sequence = sequence
+        return CamApiStatus.Success
+
+    def get_chunk_mode_active(self):
+        return CamApiStatus.Success, self.chunk_mode_active
+
+    def set_chunk_mode_active(self, value):
+        self.chunk_mode_active = bool(value)
+        return CamApiStatus.Success
+
+    def get_chunk_enable(self, selector):
+        return CamApiStatus.Success, selector in self.chunk_enable
+
+    def set_chunk_enable(self, selector, value):
+        if value:
+            self.chunk_enable.add(selector)
+        else:
+            self.chunk_enable.discard(selector)
+        return CamApiStatus.Success
+
+
+class GenApiWrapper:
+    # Node access by name: commands, chunk values and the common float/int features
+    def __init__(self, device):
+        self.device = device
+        self.chunk = None  # ImageData attached with chunk_attach_buffer()
+
+    def execute_command(self, name):
+        if name == "TriggerSoftware":
+            return self.device.cam_stream.software_trigger()
+        return CamApiStatus.NotImplemented
+
+    def get_int_value(self, name):
+        control = self.device.cam_control
+        if name == "ChunkFrameID":
+            if self.chunk is None or CameraChunkSelector.BlockID not in control.chunk_enable:
+                return CamApiStatus.NotReady, 0
+            return CamApiStatus.Success, self.chunk.block_id
+        values = {"Width": control.width, "Height": control.height,
+                  "OffsetX": control.offset_x, "OffsetY": control.offset_y}
+        if name not in values:
+            return CamApiStatus.NotImplemented, 0
+        return CamApiStatus.Success, values[name]
+
+    def get_float_value(self, name):
+        control = self.device.cam_control
+        if name == "ChunkExposureTime":
+            if self.chunk is None or CameraChunkSelector.ExposureTime not in control.chunk_enable:
+                return CamApiStatus.NotReady, 0.0
+            return CamApiStatus.Success, self.chunk.chunk_exposure_time
+        if name == "ChunkGain":
+            if self.chunk is None or CameraChunkSelector.Gain not in control.chunk_enable:
+                return CamApiStatus.NotReady, 0.0
+            return CamApiStatus.Success, self.chunk.chunk_gain
+        values = {"Gain": control.gain, "ExposureTime": control.exposure_time,
+                  "AcquisitionFrameRate": control.frame_rate}
+        if name not in values:
+            return CamApiStatus.NotImplemented, 0.0
+        return CamApiStatus.Success, values[name]
+
+
+class ImageData:
+    # One slot of the stream ring buffer
+    def __init__(self, stream, index):
+        self.stream = stream
+        self.lock_buffer_index = index
+        self.buffer = None  # Raw pixel data for the current frame
+        self.status = CamApiStatus.NotReady
+        self.pixel_format = CameraPixelFormat.Unknown
+        self.size_x = 0
+        self.size_y = 0
+        self.offset_x = 0
+        self.offset_y = 0
+        self.padding_x = 0
+        self.timestamp = 0
+        self.block_id = 0
+        self.image_id = 0
+        self.chunk = False
+        self.chunk_exposure_time = 0.0
+        self.chunk_gain = 0.0
+        self.locks = 0
+        self.camera_device = stream.device
+
+    @property
+    def size(self):
+        return 0 if self.buffer is None else self.buffer.nbytes
+
+    def get_ndarray(self, output_type=OutputImageType.Raw, bayer_conv_mode=None):
+        if output_type == OutputImageType.Raw:
+            return self.buffer  # Like the SDK, a view of the ring buffer that is reused after release()
+        if self.pixel_format == CameraPixelFormat.Mono8:
+            image = cv2.cvtColor(self.buffer, cv2.COLOR_GRAY2BGR)
+        elif self.pixel_format == CameraPixelFormat.BGR8:
+            image = self.buffer.copy()
+        else:
+            image = cv2.cvtColor(self.buffer, BAYER_TO_BGR[self.pixel_format])
+        if output_type == OutputImageType.Bgra32:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+        return image
+
+    def get_memoryview(self):
+        return memoryview(self.buffer)
+
+    def release(self):
+        self.stream.unlock(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.release()
+        return False
+
+
+# GenICam names the Bayer pattern from the first pixel, OpenCV from the second row
+BAYER_TO_BGR = {
+    CameraPixelFormat.BayerRG8: cv2.COLOR_BayerBG2BGR,
+    CameraPixelFormat.BayerGR8: cv2.COLOR_BayerGB2BGR,
+    CameraPixelFormat.BayerGB8: cv2.COLOR_BayerGR2BGR,
+    CameraPixelFormat.BayerBG8: cv2.COLOR_BayerRG2BGR,
+}
+
+
+class CameraStream:
+    # Stream ring buffer fed by a frame generator thread
+    def __init__(self, device):
+        self.device = device
+        self.is_open = False
+        self.is_grabbing = False
+        self.signal = None
+        self.buffers = []
+        self.current_index = -1
+        self.lock = threading.Lock()
+        self.next_image = threading.Condition(self.lock)
+        self.callback_image_acquired = None
+        self.callback_image_error = None
+        self.callback_buffer_busy = None
+        self.triggers = 0  # Software triggers not yet turned into frames
+        self.trigger_cond = threading.Condition()
+        self.thread = None
+        self.block_id = 0
+        self.image_id = 0
+        self.pattern = None
+
+    def open(self, acquired_signal=None, api_buffer_count=0, max_packet_size=0):
+        if self.is_open:
+            raise PytelicamError("Stream already opened", CamApiStatus.Busy)
+        if not 0 <= api_buffer_count <= 128:
+            raise PytelicamError(f"Invalid api_buffer_count {api_buffer_count}", CamApiStatus.InvalidParameter)
+        if api_buffer_count == 0:
+            _, payload = self.device.cam_control.get_stream_payload_size()
+            api_buffer_count = max(3, 8 - max(0, payload - 8 * 2 ** 20) // (8 * 2 ** 20))  # SDK default table
+        self.signal = acquired_signal
+        self.buffers = [ImageData(self, index) for index in range(api_buffer_count)]
+        self.current_index = -1
+        self.is_open = True
+
+    def close(self):
+        if self.is_grabbing:
+            self.stop()
+        self.is_open = False
+        self.buffers = []
+
+    def start(self):
+        if not self.is_open:
+            raise PytelicamError("Stream is not open", CamApiStatus.NotReady)
+        if self.is_grabbing:
+            return
+        self.block_id = 0  # The camera restarts its frame IDs with every AcquisitionStart
+        self.current_index = -1
+        self.pattern = self._make_pattern()
+        self.is_grabbing = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.is_grabbing = False
+        with self.trigger_cond:
+            self.trigger_cond.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def abort(self):
+        self.stop()
+
+    def set_callback_image_acquired(self, func):
+        self.callback_image_acquired = func
+
+    def reset_callback_image_acquired(self):
+        self.callback_image_acquired = None
+
+    def set_callback_image_error(self, func):
+        self.callback_image_error = func
+
+    def reset_callback_image_error(self):
+        self.callback_image_error = None
+
+    def set_callback_buffer_busy(self, func):
+        self.callback_buffer_busy = func
+
+    def reset_callback_buffer_busy(self):
+        self.callback_buffer_busy = None
+
+    def get_current_buffer_index(self):
+        return self.current_index
+
+    def get_buffered_image(self, buffer_index):
+        with self.lock:
+            image_data = self.buffers[buffer_index]
+            image_data.locks += 1
+            return image_data
+
+    def get_current_buffered_image(self):
+        with self.lock:
+            if self.current_index < 0:
+                raise PytelicamError("No image has been stored", CamApiStatus.NotReady)
+            image_data = self.buffers[self.current_index]
+            image_data.locks += 1
+            return image_data
+
+    def get_next_image(self, timeout=5000):
+        with self.lock:
+            image_id = self.image_id
+            if not self.next_image.wait_for(lambda: self.image_id != image_id, None if timeout < 0 else timeout / 1000.0):
+                raise PytelicamError("Timeout", CamApiStatus.Timeout)
+            image_data = self.buffers[self.current_index]
+            image_data.locks += 1
+            return image_data
+
+    def unlock(self, image_data):
+        with self.lock:
+            image_data.locks = max(0, image_data.locks - 1)
+
+    def chunk_attach_buffer(self, image_data):
+        if not image_data.chunk:
+            raise PytelicamError("No chunk data is attached to the image data", CamApiStatus.NotReady)
+        self.device.genapi.chunk = image_data
+
+    def software_trigger(self):
+        control = self.device.cam_control
+        if not control.trigger_mode or control.trigger_source != CameraTriggerSource.Software:
+            return CamApiStatus.NotReady
+        with self.trigger_cond:
+            self.triggers += 1
+            self.trigger_cond.notify_all()
+        return CamApiStatus.Success
+
+    def _make_pattern(self):
+        # Static gradient with per-camera noise; frames add a moving bar so encoders see motion
+        control = self.device.cam_control
+        rng = np.random.default_rng(self.device.index)
+        x = np.linspace(0, 255, control.width, dtype=np.float32)
+        y = np.linspace(0, 255, control.height, dtype=np.float32)[:, None]
+        gray = ((x + y) / 2 + rng.normal(0, 8, (control.height, control.width))).clip(0, 255).astype(np.uint8)
+        if self.device.pixel_format == CameraPixelFormat.BGR8:
+            return np.dstack([gray, np.flipud(gray), np.fliplr(gray)])
+        return gray
+
+    def _wait_for_trigger(self, last_pulse):
+        # Returns once a trigger arrives (with the line's pulse count), or when the stream stops
+        control = self.device.cam_control
+        if control.trigger_source == CameraTriggerSource.Software:
+            with self.trigger_cond:
+                self.trigger_cond.wait_for(lambda: self.triggers > 0 or not self.is_grabbing)
+                if not self.is_grabbing:
+                    return None
+                self.triggers -= 1
+                return last_pulse
+        line = self.device.system.trigger_line(control.trigger_source)
+        if last_pulse is None:
+            last_pulse = line.pulses  # Wait for the next pulse, not one that happened before the stream started
+        while self.is_grabbing:
+            pulse = line.wait(last_pulse, 0.5)
+            if pulse != last_pulse:
+                return pulse
+        return None
+
+    def _run(self):
+        config = self.device.system.config
+        rng = self.device.system.rng
+        control = self.device.cam_control
+        next_time = time.monotonic()
+        last_pulse = None
+        while self.is_grabbing:
+            if control.trigger_mode:
+                last_pulse = self._wait_for_trigger(last_pulse)
+                if last_pulse is None and not self.is_grabbing:
+                    break
+            else:
+                period = 1.0 / (config.fps or control.frame_rate)
+                next_time += max(0.0, period + (rng.gauss(0.0, config.jitter) if config.jitter else 0.0))
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.monotonic()
+            if config.stall_rate and rng.random() < config.stall_rate:
+                time.sleep(config.stall_time)  # The camera stops sending for a while
+                next_time = time.monotonic()
+            self.block_id += 1
+            if config.drop_rate and rng.random() < config.drop_rate:
+                continue  # Lost before reaching the host, only the frame ID gap shows it
+            self._store(rng.random() < config.error_rate if config.error_rate else False)
+
+    def _store(self, error):
+        control = self.device.cam_control
+        with self.lock:
+            index = (self.current_index + 1) % len(self.buffers)
+            image_data = self.buffers[index]
+            if image_data.locks:
+                busy = True
+            else:
+                busy = False
+                image = self.pattern.copy()
+                bar = (self.block_id * 16) % image.shape[1]
+                image[:, bar:bar + 16] = 255 - image[:, bar:bar + 16]
+                image_data.buffer = image
+                image_data.status = CamApiStatus.IoDeviceError if error else CamApiStatus.Success
+                image_data.pixel_format = self.device.pixel_format
+                image_data.size_x = control.width
+                image_data.size_y = control.height
+                image_data.offset_x = control.offset_x
+                image_data.offset_y = control.offset_y
+                image_data.timestamp = time.monotonic_ns()
+                image_data.block_id = self.block_id
+                self.image_id += 1
+                image_data.image_id = self.image_id
+                image_data.chunk = control.chunk_mode_active
+                image_data.chunk_exposure_time = control.exposure_time
+                image_data.chunk_gain = control.gain
+                self.current_index = index
+                self.next_image.notify_all()
+        if busy:
+            if self.callback_buffer_busy is not None:
+                self.callback_buffer_busy(index)
+            return
+        if self.signal is not None:
+            self.signal.event.set()
+        if error and self.callback_image_error is not None:
+            self.callback_image_error(image_data.status, index)
+        if self.callback_image_acquired is not None:
+            with self.lock:
+                image_data.locks += 1  # Locked for the duration of the callback, as in the SDK
+            try:
+                self.callback_image_acquired(image_data)
+            finally:
+                image_data.release()
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # TCPApp.py and simcam.py live in the repo root
+
+
+@pytest.fixture
+def simulated_recorder():
+    # Makes Recorders on the simulated cameras in simcam.py and cleans them up afterwards
+    import TCPApp
+    recorders = []
+
+    def make(cameras=2, pixel_format="BayerRG8", **options):
+        TCPApp.use_simulated_cameras(cameras=cameras, pixel_format=pixel_format)
+        options = {"preview": False, "profile_dir": None, "width": 320, "height": 240, **options}
+        recorder = TCPApp.Recorder(**options)
+        recorders.append(recorder)
+        return recorder
+
+    yield make
+    for recorder in recorders:
+        recorder.cleanup()
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import TCPApp
+
+
+def write_config(tmp_path, config, name="cameras.json"):
+    path = tmp_path / name
+    path.write_text(json.dumps(config) if name.endswith(".json") else config)
+    return str(path)
+
+
+def test_json_config(tmp_path):
+    path = write_config(tmp_path, {"defaults": {"fps": 30, "gain": 12}, "cameras": {"1234567": {"offset_x": 64}}})
+    assert TCPApp.load_camera_config(path) == {"defaults": {"fps": 30, "gain": 12}, "cameras": {"1234567": {"offset_x": 64}}}
+
+def test_toml_config(tmp_path):
+    path = write_config(tmp_path, '[defaults]\nfps = 30.0\nwhite_balance = "off"\n\n[cameras.1234567]\ngain = 18.0\n',
+                        "cameras.toml")
+    config = TCPApp.load_camera_config(path)
+    assert config == {"defaults": {"fps": 30.0, "white_balance": "off"}, "cameras": {"1234567": {"gain": 18.0}}}
+
+def test_missing_sections(tmp_path):
+    assert TCPApp.load_camera_config(write_config(tmp_path, {})) == {"defaults": {}, "cameras": {}}
+
+def test_none_keeps_the_camera_default(tmp_path):
+    config = TCPApp.load_camera_config(write_config(tmp_path, {"defaults": {"exposure_time": None}}))
+    assert config["defaults"] == {"exposure_time": None}
+
+@pytest.mark.parametrize("config, error", [
+    ({"default": {}}, "unknown section"),
+    ({"defaults": {"framerate": 30}}, "unknown setting defaults.framerate"),
+    ({"defaults": {"width": 320.5}}, "defaults.width must be int"),
+    ({"defaults": {"gain": "12"}}, "defaults.gain must be float"),
+    ({"cameras": {"1234567": {"width": True}}}, r"cameras.1234567.width must be int, not True"),
+    ({"defaults": {"fps": False}}, "defaults.fps must be float, not False"),
+    ({"defaults": {"white_balance": "auto"}}, "white_balance must be one of"),
+    ({"cameras": {"1234567": {"field_of_view": "wide"}}}, "cameras.1234567.field_of_view must be crop or full"),
+])
+def test_rejected(tmp_path, config, error):
+    with pytest.raises(Exception, match=error):
+        TCPApp.load_camera_config(write_config(tmp_path, config))
+
+def test_settings_by_serial(simulated_recorder):
+    config = {"defaults": {"fps": 20.0, "gain": 6.0}, "cameras": {"SIM00001": {"gain": 12.0, "exposure_time": 5000.0},
+                                                                   "SIM09999": {"gain": 1.0}}}
+    recorder = simulated_recorder(camera_config=config)
+    assert recorder.fps == 20.0
+    assert [settings["gain"] for settings in recorder.camera_settings] == [6.0, 12.0]
+    assert recorder.camera_settings[1]["exposure_time"] == 5000.0
+    assert all(row["ok"] for i in range(recorder.cam_num) for row in recorder.verify_camera(i))
+    assert recorder._read_feature(1, "gain") == pytest.approx(12.0)
+
+def test_unchanged_features_are_not_written(simulated_recorder):
+    recorder = simulated_recorder(cameras=1)
+    writes = recorder.feature_writes[0].copy()
+    assert recorder._write_feature(0, "gain", recorder._read_feature(0, "gain")) == TCPApp.pytelicam.CamApiStatus.Success
+    assert recorder.feature_writes[0]["skipped"] == writes["skipped"] + 1
+    assert recorder.feature_writes[0]["written"] == writes["written"]
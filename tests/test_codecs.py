@@ -0,0 +1,43 @@
+import argparse
+
+import numpy as np
+import pytest
+
+import TCPApp
+import benchmark
+
+
+def ffmpeg_args(monkeypatch, codec, is_color):
+    # The command line open_video_writer() would start ffmpeg with
+    started = []
+    monkeypatch.setattr(TCPApp.subprocess, "Popen", lambda args, **kwargs: started.append(args))
+    TCPApp.open_video_writer(TCPApp.CODECS[codec], "out.mkv", 30, (64, 48), is_color)
+    return started[0]
+
+
+def test_parse_codecs():
+    assert benchmark.parse_codecs("mp4v,mjpg") == ["mp4v", "mjpg"]
+
+def test_parse_codecs_rejects_unknown_codecs():
+    with pytest.raises(argparse.ArgumentTypeError, match="h264"):
+        benchmark.parse_codecs("mjpg,h264")
+
+@pytest.mark.parametrize("codec, is_color, pix_fmt", [("x264", True, "yuv420p"), ("x264", False, "yuv420p"),
+                                                      ("ffv1-ffmpeg", True, "bgr0"), ("ffv1-ffmpeg", False, "gray")])
+def test_ffmpeg_output_pixel_format(monkeypatch, codec, is_color, pix_fmt):
+    args = ffmpeg_args(monkeypatch, codec, is_color)
+    output = args.index("-c:v")
+    assert args[args.index("-pix_fmt", output) + 1] == pix_fmt
+    assert args[args.index("-pix_fmt") + 1] == ("bgr24" if is_color else "gray")  # The piped input
+
+def test_missing_ffmpeg_fails_at_open(tmp_path):
+    with pytest.raises(Exception, match="Can't start"):
+        TCPApp.FFmpegVideoWriter(str(tmp_path / "out.mkv"), 30, (64, 48), command=str(tmp_path / "no-ffmpeg"))
+
+def test_opencv_writer(tmp_path):
+    filename = str(tmp_path / "out.avi")
+    writer = TCPApp.open_video_writer(TCPApp.CODECS["mjpg"], filename, 30, (64, 48))
+    for n in range(3):
+        writer.write(np.full((48, 64, 3), n * 40, np.uint8))
+    writer.release()
+    assert (tmp_path / "out.avi").stat().st_size > 0
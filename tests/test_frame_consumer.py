@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+import TCPApp
+
+
+def frame(cam, frame_id):
+    return TCPApp.Frame(cam, None, None, frame_id, 0)
+
+def drain(consumer):
+    frames = []
+    while (f := consumer.get(timeout=0)) is not None:
+        frames.append((f.cam, f.frame_id))
+    return frames
+
+
+def test_unknown_policy():
+    with pytest.raises(Exception, match="Unknown drop policy"):
+        TCPApp.FrameConsumer("test", policy="drop_all")
+
+def test_drop_oldest_keeps_the_newest_frames():
+    consumer = TCPApp.FrameConsumer("test", depth=2, policy="drop_oldest")
+    for n in range(4):
+        assert consumer.put(frame(0, n))
+    assert drain(consumer) == [(0, 2), (0, 3)]
+    assert consumer.dropped == 2 and consumer.delivered == 4
+
+def test_drop_newest_keeps_the_oldest_frames():
+    consumer = TCPApp.FrameConsumer("test", depth=2, policy="drop_newest")
+    results = [consumer.put(frame(0, n)) for n in range(4)]
+    assert results == [True, True, False, False]
+    assert drain(consumer) == [(0, 0), (0, 1)]
+    assert consumer.dropped == 2
+
+def test_latest_keeps_one_frame_per_camera():
+    consumer = TCPApp.FrameConsumer("test", depth=4, policy="latest")
+    for n in range(3):
+        consumer.put(frame(0, n))
+        consumer.put(frame(1, n))
+    assert drain(consumer) == [(0, 2), (1, 2)]
+    assert consumer.dropped == 4
+
+def test_block_waits_for_room():
+    consumer = TCPApp.FrameConsumer("test", depth=1, policy="block", block_timeout=2.0)
+    consumer.put(frame(0, 0))
+    threading.Timer(0.1, consumer.get).start()
+    start = time.monotonic()
+    assert consumer.put(frame(0, 1))
+    assert time.monotonic() - start >= 0.05
+    assert drain(consumer) == [(0, 1)]
+    assert consumer.dropped == 0
+
+def test_block_gives_up_after_block_timeout():
+    consumer = TCPApp.FrameConsumer("test", depth=1, policy="block", block_timeout=0.05)
+    consumer.put(frame(0, 0))
+    assert not consumer.put(frame(0, 1))
+    assert consumer.dropped == 1
+
+def test_preloaded_frames_dont_count_against_depth():
+    consumer = TCPApp.FrameConsumer("test", depth=1, policy="drop_newest")
+    consumer.preload([frame(0, n) for n in range(3)])
+    assert consumer.put(frame(0, 3))
+    assert drain(consumer) == [(0, 0), (0, 1), (0, 2), (0, 3)]
+
+def test_closed_consumer_drains_then_returns_none():
+    consumer = TCPApp.FrameConsumer("test", depth=2)
+    consumer.put(frame(0, 0))
+    consumer.close()
+    assert not consumer.put(frame(0, 1))
+    assert consumer.get(timeout=1).frame_id == 0
+    assert consumer.get(timeout=1) is None
+
+def test_wants_filters_cameras():
+    consumer = TCPApp.FrameConsumer("test", cams=[1])
+    assert consumer.wants(1) and not consumer.wants(0)
+    assert TCPApp.FrameConsumer("test").wants(5)
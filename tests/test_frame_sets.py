@@ -0,0 +1,124 @@
+import time
+
+import TCPApp
+
+PERIOD = 0.04
+
+
+def settle(source):
+    # Let the assembler take every queued frame, as restart_camera() does by pausing the camera
+    while source.frames:
+        time.sleep(0.01)
+    time.sleep(0.05)
+
+
+def assemble(starts, cams=4, pulses=20, period=PERIOD, resync=None):
+    # Feed every camera one frame per pulse from its start pulse on and return the assembler
+    # with each camera's released frames as pulse numbers. resync is (camera, pulse): that
+    # camera's stream restarts there, so its frame IDs start over.
+    source = TCPApp.FrameConsumer("source", depth=1000, policy="block")
+    output = TCPApp.FrameConsumer("output", depth=1000, policy="block")
+    assembler = TCPApp.FrameSetAssembler(cams, source, period=period)
+    assembler.add_output(output)
+    assembler.start()
+    for pulse in range(pulses):
+        for cam in range(cams):
+            if pulse < starts[cam]:
+                continue
+            frame_id = pulse - starts[cam] + 1
+            if resync is not None and cam == resync[0] and pulse >= resync[1]:
+                frame_id = pulse - resync[1] + 1
+            frame = TCPApp.Frame(cam, None, None, frame_id, 0)
+            frame.received = 100 + pulse * PERIOD + cam * 0.001
+            if resync is not None and (cam, pulse) == resync:
+                settle(source)
+                assembler.resync(cam)  # As restart_camera() does before the stream starts again
+            source.put(frame)
+    source.close()
+    assembler.join()
+    released = {}
+    while (frame := output.get(timeout=0)) is not None:
+        released.setdefault(frame.cam, []).append(round((frame.received - 100) / PERIOD))
+    return assembler, released
+
+
+def test_cameras_starting_together():
+    assembler, released = assemble([0, 0, 0, 0])
+    assert assembler.complete == 20 and assembler.incomplete == 0
+    assert all(pulses == list(range(20)) for pulses in released.values())
+    assert assembler.misaligned == 0
+
+def test_late_cameras_are_aligned_by_receive_time():
+    # Two cameras missed the first pulse, so their frame 1 answers the others' frame 2
+    assembler, released = assemble([0, 0, 1, 1])
+    assert all(pulses == list(range(1, 20)) for pulses in released.values())
+    assert assembler.unaligned == 2  # The first pulse's frames from the early cameras
+    assert assembler.complete == 19 and assembler.incomplete == 0 and assembler.misaligned == 0
+
+def test_first_camera_to_deliver_started_late():
+    assembler, released = assemble([1, 0, 0, 2])
+    assert all(pulses == list(range(2, 20)) for pulses in released.values())
+    assert assembler.complete == 18 and assembler.misaligned == 0
+
+def test_without_a_period_frame_ids_decide():
+    # Every first frame goes in set 0, so the late cameras' sets are a pulse behind
+    assembler, released = assemble([0, 0, 1, 1], period=None)
+    assert released[0][:3] == [0, 1, 2] and released[2][:3] == [1, 2, 3]
+    assert assembler.unaligned == 0 and assembler.misaligned == 0  # No period to compare the spread with
+
+def test_spread_of_a_period_is_reported(capsys):
+    source = TCPApp.FrameConsumer("source", depth=100, policy="block")
+    assembler = TCPApp.FrameSetAssembler(2, source, period=PERIOD)
+    for pulse in range(6):
+        for cam in range(2):
+            frame = TCPApp.Frame(cam, None, None, pulse + 1, 0)
+            frame.received = 100 + pulse * PERIOD
+            if cam == 1 and pulse >= 3:
+                frame.received += 0.6 * PERIOD  # Camera 1 answers the next pulse from here on
+            source.put(frame)
+    source.close()
+    assembler.start()
+    assembler.join()
+    assert assembler.complete == 6 and assembler.misaligned == 3
+    assert "answering different pulses" in capsys.readouterr().out
+
+def test_incomplete_sets_repeat_the_previous_frame():
+    source = TCPApp.FrameConsumer("source", depth=100, policy="block")
+    output = TCPApp.FrameConsumer("output", depth=100, policy="block")
+    assembler = TCPApp.FrameSetAssembler(2, source, max_pending=2, period=PERIOD)
+    assembler.add_output(output)
+    for pulse in range(6):
+        for cam in range(2):
+            if cam == 1 and pulse == 2:
+                continue  # Camera 1 lost this frame
+            frame = TCPApp.Frame(cam, None, None, pulse + 1, 0)
+            frame.received = 100 + pulse * PERIOD
+            source.put(frame)
+    source.close()
+    assembler.start()
+    assembler.join()
+    frames = []
+    while (frame := output.get(timeout=0)) is not None:
+        frames.append((frame.cam, frame.frame_id))
+    assert frames[4:6] == [(0, 3), (1, 2)]  # Set 2 repeats camera 1's frame from set 1
+    assert assembler.incomplete == 1 and assembler.complete == 5
+
+def test_resync_places_a_restarted_camera_by_receive_time():
+    assembler, released = assemble([0, 0, 0, 0], resync=(2, 10))
+    assert released[2] == list(range(20))
+    assert assembler.complete == 20 and assembler.late == 0
+
+def test_resync_to_a_known_set():
+    source = TCPApp.FrameConsumer("source", depth=100, policy="block")
+    assembler = TCPApp.FrameSetAssembler(2, source, period=None)
+    assembler.start()
+    for pulse in range(6):
+        for cam in range(2):
+            frame_id = pulse - 2 if cam == 1 and pulse >= 3 else pulse + 1  # Camera 1 restarts before pulse 3
+            if cam == 1 and pulse == 3:
+                settle(source)
+                assembler.resync(1, 3)
+            source.put(TCPApp.Frame(cam, None, None, frame_id, 0))
+    source.close()
+    assembler.join()
+    assert assembler.complete == 6 and assembler.incomplete == 0
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+import TCPApp
+
+
+def streaming(recorder, seconds=0.3):
+    # Whether each camera delivered a frame within the next `seconds`
+    before = [stats.frames for stats in recorder.cam_stats]
+    time.sleep(seconds)
+    return [stats.frames > count for stats, count in zip(recorder.cam_stats, before)]
+
+def failing_geometry(recorder, sizes):
+    # Make _configure_geometry refuse the given (width, height) sizes, as a camera refusing an ROI would
+    configure = recorder._configure_geometry
+
+    def configure_geometry(i, width, height):
+        if (width, height) in sizes:
+            raise Exception(f"{width}x{height} refused")
+        return configure(i, width, height)
+    recorder._configure_geometry = configure_geometry
+
+
+def test_live_settings_keep_the_stream_running(simulated_recorder):
+    recorder = simulated_recorder()
+    assert recorder.apply_settings(gain=9.0, exposure_time=8000.0)
+    assert all(settings["gain"] == 9.0 and settings["exposure_time"] == 8000.0 for settings in recorder.camera_settings)
+    assert recorder._read_feature(1, "gain") == pytest.approx(9.0)
+    assert all(streaming(recorder))
+
+def test_unknown_setting(simulated_recorder):
+    recorder = simulated_recorder()
+    with pytest.raises(Exception, match="Unknown setting"):
+        recorder.apply_settings(brightness=1.0)
+
+@pytest.mark.parametrize("fps", [0, -5.0, float("nan")])
+def test_frame_rate_must_be_positive(simulated_recorder, fps):
+    recorder = simulated_recorder()
+    with pytest.raises(Exception, match="must be above 0"):
+        recorder.apply_settings(fps=fps)
+
+def test_rig_frame_rate_follows_the_cameras(simulated_recorder):
+    recorder = simulated_recorder(trigger_source="Software")
+    recorder.apply_settings(fps=40.0)
+    assert recorder.fps == 40.0
+    assert recorder.frame_sets.period == pytest.approx(1 / 40)
+
+def test_rejected_frame_rate_keeps_the_rig_rate(simulated_recorder, capsys):
+    recorder = simulated_recorder()
+    recorder.apply_settings(fps=500.0)  # Above what the simulated cameras accept
+    assert recorder.fps == 25
+    assert "can't set fps" in capsys.readouterr().out
+
+def test_one_camera_frame_rate_leaves_the_rig_rate(simulated_recorder):
+    recorder = simulated_recorder()
+    recorder.apply_settings([1], fps=10.0)
+    assert recorder.fps == 25 and recorder._read_feature(1, "acquisition_frame_rate") == pytest.approx(10.0)
+
+@pytest.mark.parametrize("value", ["0", "-1", "nan"])
+def test_set_fps_checks_the_value(simulated_recorder, capsys, value):
+    recorder = simulated_recorder()
+    TCPApp.handle_set(recorder, ["fps", value])
+    assert "must be above 0" in capsys.readouterr().out
+    assert recorder.fps == 25
+
+def test_restart_changes_one_camera(simulated_recorder):
+    recorder = simulated_recorder()
+    assert recorder.restart_camera(1, width=640, height=480) is not None
+    assert recorder.frame_sizes == [(320, 240), (640, 480)]
+    assert recorder.cam_stats[1].restart_error is None
+    assert all(streaming(recorder))
+
+def test_refused_geometry_keeps_the_previous_one(simulated_recorder, capsys):
+    recorder = simulated_recorder()
+    failing_geometry(recorder, {(640, 480)})
+    assert recorder.restart_camera(1, width=640, height=480) is not None
+    assert "kept 320x240, 640x480 refused" in capsys.readouterr().out
+    assert recorder.camera_settings[1]["width"] == 320 and not recorder.paused[1]
+    assert all(streaming(recorder))
+
+def test_failed_restart_stops_only_that_camera(simulated_recorder, capsys):
+    recorder = simulated_recorder(trigger_source="Software")
+    failing_geometry(recorder, {(640, 480), (320, 240)})
+    assert recorder.restart_camera(1, width=640, height=480) is None
+    assert "Camera 1: restart failed" in capsys.readouterr().out
+    assert recorder.paused[1] and recorder.cam_stats[1].restart_error == "320x240 refused"
+    assert streaming(recorder) == [True, False]
+    recorder.print_stats()
+    assert "restart failed: 320x240 refused" in capsys.readouterr().out
+
+    del recorder._configure_geometry  # The camera accepts geometry again
+    assert recorder.restart_camera(1, width=640, height=480) is not None  # Another change retries the camera
+    assert not recorder.paused[1] and recorder.cam_stats[1].restart_error is None
+    assert all(streaming(recorder))
@@ -0,0 +1,39 @@
+import types
+
+import TCPApp
+
+
+def ring(buffer_count):
+    # Just the state _pending_indices() uses, so no camera is needed
+    stats = TCPApp.CameraStats()
+    stats.buffer_count = buffer_count
+    return types.SimpleNamespace(last_buffer_index=[-1], cam_stats=[stats])
+
+def pending(recorder, current_index):
+    return TCPApp.Recorder._pending_indices(recorder, 0, current_index)
+
+
+def test_first_visit_reads_only_the_current_slot():
+    recorder = ring(4)
+    assert pending(recorder, 2) == [2]
+    assert recorder.cam_stats[0].visits == 0
+
+def test_every_slot_filled_since_the_last_visit():
+    recorder = ring(8)
+    pending(recorder, 1)
+    assert pending(recorder, 4) == [2, 3, 4]
+    assert recorder.cam_stats[0].backlog_max == 3
+
+def test_wraps_around_the_ring():
+    recorder = ring(4)
+    pending(recorder, 2)
+    assert pending(recorder, 1) == [3, 0, 1]
+    assert pending(recorder, 2) == [2]
+
+def test_full_ring_is_counted():
+    recorder = ring(4)
+    pending(recorder, 0)
+    assert pending(recorder, 3) == [1, 2, 3]
+    stats = recorder.cam_stats[0]
+    assert stats.ring_full == 1 and stats.overruns() == 1
+    assert stats.visits == 1 and stats.backlog_total == 3
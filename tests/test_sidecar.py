@@ -0,0 +1,70 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+import TCPApp
+
+
+def write_sidecar(path, frames):
+    sidecar = TCPApp.FrameSidecar(str(path))
+    for n in range(frames):
+        sidecar.append(100 + n if n != 1 else None, 1000 * n, 10.0 + n, 10.5 + n, n // 2, n % 2)
+    sidecar.close()
+    return str(path)
+
+def segmented_writer(tmp_path, **options):
+    return TCPApp.SegmentedWriter(0, TCPApp.CODECS["mjpg"], str(tmp_path / "cam0"), 30, (64, 48),
+                                  str(tmp_path / "session.manifest.jsonl"), **options)
+
+
+def test_round_trip(tmp_path):
+    records = TCPApp.load_sidecar(write_sidecar(tmp_path / "cam0.frames", 4))
+    assert isinstance(records, np.ndarray)
+    assert records.dtype == TCPApp.SIDECAR_DTYPE and len(records) == 4
+    assert list(records["frame"]) == [0, 1, 2, 3]
+    assert list(records["frame_id"]) == [100, -1, 102, 103]  # -1 for a frame without an ID
+    assert list(records["camera_timestamp"]) == [0, 1000, 2000, 3000]
+    assert list(records["received"]) == [10.0, 11.0, 12.0, 13.0]
+    assert list(records["segment"]) == [0, 0, 1, 1] and list(records["segment_frame"]) == [0, 1, 0, 1]
+
+def test_wall_offset(tmp_path):
+    path = write_sidecar(tmp_path / "cam0.frames", 1)
+    assert TCPApp.sidecar_wall_offset(path) == pytest.approx(time.time() - time.monotonic(), abs=5)
+
+def test_partial_record_is_ignored(tmp_path):
+    path = write_sidecar(tmp_path / "cam0.frames", 3)
+    with open(path, "ab") as f:
+        f.write(b"\0" * (TCPApp.SIDECAR_DTYPE.itemsize // 2))  # A crash in the middle of a record
+    assert len(TCPApp.load_sidecar(path)) == 3
+
+def test_header_only(tmp_path):
+    records = TCPApp.load_sidecar(write_sidecar(tmp_path / "cam0.frames", 0))
+    assert len(records) == 0 and records.dtype == TCPApp.SIDECAR_DTYPE
+
+def test_not_a_sidecar(tmp_path):
+    path = tmp_path / "cam0.frames"
+    path.write_bytes(b"not a sidecar, but long enough for a header")
+    with pytest.raises(Exception, match="this version can read"):
+        TCPApp.load_sidecar(str(path))
+    path.write_bytes(b"short")
+    with pytest.raises(Exception, match="is not a frame sidecar"):
+        TCPApp.load_sidecar(str(path))
+
+def test_segmented_writer_sidecar(tmp_path):
+    writer = segmented_writer(tmp_path, segment_frames=2)
+    for n in range(5):
+        writer.write(np.zeros((48, 64, 3), np.uint8), frame_id=n + 1, received=20.0 + n)
+    writer.release()
+    records = TCPApp.load_sidecar(str(tmp_path / "cam0.frames"))
+    assert list(records["frame_id"]) == [1, 2, 3, 4, 5]
+    assert list(records["segment"]) == [0, 0, 1, 1, 2] and list(records["segment_frame"]) == [0, 1, 0, 1, 0]
+    manifest = TCPApp.read_manifest(str(tmp_path / "session.manifest.jsonl"))
+    assert [segment["frames"] for segment in manifest] == [2, 2, 1]
+    assert all(segment["sidecar"] == str(tmp_path / "cam0.frames") for segment in manifest)
+
+def test_empty_recording_leaves_nothing_behind(tmp_path):
+    writer = segmented_writer(tmp_path, segment_frames=2)
+    writer.release()
+    assert os.listdir(tmp_path) == []